@@ -0,0 +1,83 @@
+SUMMARY_KEYS = ("expense_summary", "income_summary", "merchant_summary", "payment_summary", "expense_total", "income_total")
+
+def merchant_key(tx):
+    return tx.get("Merchant") or tx.get("Transaction") or tx.get("Category") or tx.get("Method") or "Unknown"
+
+def new_bucket():
+    return {"expense": {}, "income": {}, "merchant": {}, "payment": {}, "tx": []}
+
+class PeriodAggregator:
+    # Reads transactions once and keys them by (Period, Type, Category/Merchant/Method).
+    # Output shapes match group_by_category / group_by_merchant / group_by_payment.
+    def __init__(self, periods, keep_tx=True):
+        self.buckets = {}
+        for p in periods:
+            self.buckets.setdefault(p, new_bucket())
+        self.keep_tx = keep_tx
+
+    def add(self, tx):
+        bucket = self.buckets.get(tx.get("Period"))
+        if bucket is not None:
+            self.add_to_bucket(bucket, tx)
+
+    def add_to_bucket(self, bucket, tx):
+        amt = tx.get("Amount", 0)
+        tx_type = tx.get("Type")
+        if tx_type == 0:
+            cats = bucket["expense"]
+        elif tx_type == 1:
+            cats = bucket["income"]
+        else:
+            cats = None
+        if cats is not None:
+            cat = tx.get("Category", "Unknown")
+            found = cats.get(cat)
+            if found:
+                found["amount"] += amt
+                found["count"] += 1
+            else:
+                cats[cat] = {"category": cat, "amount": amt, "count": 1}
+        m = merchant_key(tx)
+        found = bucket["merchant"].get(m)
+        if found:
+            found["amount"] += amt
+            found["count"] += 1
+        else:
+            bucket["merchant"][m] = {"merchant": m, "amount": amt, "count": 1}
+        payment = bucket["payment"]
+        method = tx.get("Method", "Unknown")
+        payment[method] = payment.get(method, 0) + amt
+        if self.keep_tx:
+            bucket["tx"].append(tx)
+
+    def add_all(self, tx_list):
+        buckets = self.buckets
+        add_to_bucket = self.add_to_bucket
+        for tx in tx_list:
+            bucket = buckets.get(tx.get("Period"))
+            if bucket is not None:
+                add_to_bucket(bucket, tx)
+        return self
+
+    def summaries(self, period):
+        bucket = self.buckets.get(period) or new_bucket()
+        return summaries_from_bucket(bucket)
+
+    def result(self):
+        return {p: summaries_from_bucket(b) for p, b in self.buckets.items()}
+
+def summaries_from_bucket(bucket):
+    expense = list(bucket["expense"].values())
+    income = list(bucket["income"].values())
+    return {
+        "expense_summary": expense,
+        "income_summary": income,
+        "merchant_summary": list(bucket["merchant"].values()),
+        "payment_summary": [{"method": k, "amount": v} for k, v in bucket["payment"].items()],
+        "expense_total": sum(item["amount"] for item in expense),
+        "income_total": sum(item["amount"] for item in income),
+        "transactions": bucket["tx"],
+    }
+
+def aggregate_periods(tx_list, periods):
+    return PeriodAggregator(periods).add_all(tx_list).result()
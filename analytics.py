@@ -0,0 +1,122 @@
+import heapq
+
+from aggregation import merchant_key
+from formatting import compact_rupees, pct_change, rupees
+
+ANOMALY_PCT = 50
+MICRO_SPEND_LIMIT = 200
+MICRO_SPEND_MIN_COUNT = 3
+
+def diff_rows(current_rows, previous_rows, field):
+    # Per-name (now, now_count, prev, prev_count) over the union of both periods, current order first
+    merged = {}
+    for row in current_rows:
+        merged[row[field]] = [row["amount"], row.get("count", 0), 0, 0]
+    for row in previous_rows:
+        item = merged.setdefault(row[field], [0, 0, 0, 0])
+        item[2], item[3] = row["amount"], row.get("count", 0)
+    return [
+        {"name": name, "amount": now, "count": count, "amount_prev": prev, "count_prev": count_prev,
+         "delta": now - prev, "pct": pct_change(now, prev)}
+        for name, (now, count, prev, count_prev) in merged.items()
+    ]
+
+def is_anomaly(row):
+    if row["amount"] <= 0:
+        return False
+    if not row["amount_prev"]:
+        return True
+    if row["pct"] is not None and row["pct"] > ANOMALY_PCT:
+        return True
+    return row["count_prev"] > 0 and row["count"] >= 3 and row["count"] >= 2 * row["count_prev"]
+
+def top_by_amount(rows, n, key="amount"):
+    return heapq.nlargest(n, rows, key=lambda row: row[key])
+
+def largest_changes(rows, n):
+    return heapq.nlargest(n, rows, key=lambda row: abs(row["delta"]))
+
+def top_transactions(tx_list, n):
+    return heapq.nlargest(n, (tx for tx in tx_list if tx.get("Type") == 0), key=lambda tx: tx.get("Amount", 0))
+
+def recurring_micro_spends(tx_list, limit=MICRO_SPEND_LIMIT, min_count=MICRO_SPEND_MIN_COUNT):
+    merchants = {}
+    for tx in tx_list:
+        amt = tx.get("Amount", 0)
+        if tx.get("Type") == 0 and amt < limit:
+            item = merchants.setdefault(merchant_key(tx), [0, 0])
+            item[0] += 1
+            item[1] += amt
+    rows = [{"name": m, "count": count, "amount": total} for m, (count, total) in merchants.items() if count >= min_count]
+    return sorted(rows, key=lambda row: (row["count"], row["amount"]), reverse=True)
+
+def transaction_facts(ctx, top_n=3, max_changes=10):
+    # The facts read from single transactions rather than the summaries; the insight
+    # cache key includes them, since a date or payee edit leaves the summaries as they were
+    transactions = ctx["current"]["transactions"]
+    return {"top_transactions": top_transactions(transactions, top_n),
+            "micro_spends": recurring_micro_spends(transactions)[:max_changes]}
+
+def compute_facts(ctx, top_n=3, max_changes=10):
+    current, previous = ctx["current"], ctx["previous"]
+    categories = diff_rows(current["expense_summary"], previous["expense_summary"], "category")
+    has_prev = bool(previous["expense_summary"] or previous["income_summary"])
+    return {
+        "has_prev": has_prev,
+        "expense_delta": current["expense_total"] - previous["expense_total"],
+        "expense_pct": pct_change(current["expense_total"], previous["expense_total"]),
+        "income_delta": current["income_total"] - previous["income_total"],
+        "category_changes": largest_changes(categories, max_changes) if has_prev else [],
+        "anomalies": [row for row in categories if is_anomaly(row)] if has_prev else [],
+        "top_categories": top_by_amount(current["expense_summary"], top_n),
+        "merchant_changes": largest_changes(diff_rows(current["merchant_summary"], previous["merchant_summary"], "merchant"), max_changes) if has_prev else [],
+        "payment_changes": largest_changes(diff_rows(current["payment_summary"], previous["payment_summary"], "method"), max_changes) if has_prev else [],
+        **transaction_facts(ctx, top_n, max_changes),
+    }
+
+def budget_group(ctx):
+    # Budget Alert/Remaining for the current month from the request's budget and days_left;
+    # precomputed insights are generated without them and get this group when served
+    budget, days_left = ctx["budget"], ctx["days_left"]
+    if not isinstance(budget, (int, float)) or budget <= 0 or ctx["period"] != ctx["current_month"]:
+        return None
+    days_left = days_left if isinstance(days_left, int) and days_left > 0 else 0
+    spent = ctx["current"]["expense_total"]
+    remaining = budget - spent
+    if remaining < 0:
+        header, detail = "Budget Alert", f"{rupees(spent)} spent, {rupees(-remaining)} over your {rupees(budget)} budget"
+    else:
+        header, detail = "Budget Remaining", f"{rupees(remaining)} left of your {rupees(budget)} budget ({rupees(spent)} spent)"
+    if days_left and remaining > 0:
+        detail += f", about {rupees(remaining / days_left)} a day for the {days_left} days left"
+    elif days_left:
+        detail += f" with {days_left} days left"
+    return {"header": header, "detail": detail + ".", "type": "budget", "category": "Budget", "transactions": []}
+
+def pct_text(pct):
+    return "new" if pct is None else f"{pct:+.0f}%"
+
+def change_row(row):
+    return f"{row['name']}|{compact_rupees(row['amount'])}|{row['count']}|{compact_rupees(row['amount_prev'])}|{row['count_prev']}|{pct_text(row['pct'])}"
+
+def join(rows):
+    return ";".join(rows) or "none"
+
+def format_fact_table(facts):
+    # Same name|value encoding as the compacted summary blocks
+    lines = [
+        f"expense_change: {compact_rupees(facts['expense_delta'])} ({pct_text(facts['expense_pct'])})" if facts["has_prev"] else "expense_change: no previous data",
+        f"income_change: {compact_rupees(facts['income_delta'])}" if facts["has_prev"] else "income_change: no previous data",
+        "category_changes (name|now|count|prev|prev_count|change): " + join(change_row(row) for row in facts["category_changes"]),
+        "anomalies (name|now|count|prev|prev_count|change): " + join(change_row(row) for row in facts["anomalies"]),
+        "top_categories (name|amount|count): " + join(f"{row['category']}|{compact_rupees(row['amount'])}|{row['count']}" for row in facts["top_categories"]),
+        "top_transactions (date|payee|category|amount): " + join(
+            f"{tx.get('Date') or tx.get('Period', '')}|{tx.get('Merchant') or tx.get('Transaction') or '-'}|{tx.get('Category', '-')}|{compact_rupees(tx.get('Amount', 0))}"
+            for tx in facts["top_transactions"]),
+        "merchant_changes (name|now|count|prev|prev_count|change): " + join(change_row(row) for row in facts["merchant_changes"]),
+        "payment_changes (method|now|prev|change): " + join(
+            f"{row['name']}|{compact_rupees(row['amount'])}|{compact_rupees(row['amount_prev'])}|{pct_text(row['pct'])}" for row in facts["payment_changes"]),
+        f"recurring_micro_spends under ₹{MICRO_SPEND_LIMIT} (payee|count|total): " + join(
+            f"{row['name']}|{row['count']}|{compact_rupees(row['amount'])}" for row in facts["micro_spends"]),
+    ]
+    return "\n".join(lines)
@@ -1,13 +1,69 @@
 import os
 import json
-import re
-import unicodedata
-from flask import Flask, request, jsonify
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from datetime import datetime
+from aggregation import SUMMARY_KEYS, aggregate_periods
+from ingest import INGEST_STREAM_MIN_BYTES, IngestError, iter_body, read_insight_request
+from insight_cache import cache_from_env, canonical_digest, normalize_query
+from jobs import JOB_WORKERS, get_job_queue, job_id, job_stats
+from analytics import budget_group, compute_facts, format_fact_table, transaction_facts
+from prompt_builder import fit_prompt
+from query_rules import help_tip, match_query, query_header
+import prompt_builder
+from response_parser import (EMPTY_CHAT_ENTRY, ResponseParseError, fix_null_entry, is_detailed_entry, normalize_entry,
+                             parse_response, process_entries, record_raw_response, validate_group)
+import response_parser
+from local_answers import answer_query, below_answer
+import local_answers
+from llm_gateway import LLMError, LLMGateway, build_client
+import metrics
+from store import InvalidTransaction, get_transaction_store
+from stream_parser import EntryStreamParser
 
 app = Flask(__name__)
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+client = build_client()
+llm = LLMGateway(client)
+# AsyncLLMGateway serving /ai-insight when running under asgi.py (SERVE_MODE=async)
+async_llm = None
+insight_cache = cache_from_env()
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 60))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 12))
+# Transaction writes precompute the no-query insight for this many most recent months
+INSIGHT_JOB_MONTHS = int(os.environ.get("INSIGHT_JOB_MONTHS", 2))
+INSIGHT_COMPLETION = {"model": "gpt-4o", "temperature": 0.65, "response_format": {"type": "json_object"}}
+
+@app.before_request
+def start_request_metrics():
+    g.metrics = metrics.start_request(request.endpoint, request.content_length or 0)
+
+@app.after_request
+def finish_request_metrics(response):
+    scope = g.get("metrics")
+    if scope is not None:
+        if response.is_streamed:
+            # SSE bodies are generated after this hook; time them until the stream closes
+            response.call_on_close(lambda: metrics.finish_request(scope, response.status_code))
+        else:
+            metrics.finish_request(scope, response.status_code)
+    return response
+
+def span(stage):
+    return metrics.span(stage, g.get("metrics"))
+
+def annotate(**fields):
+    scope = g.get("metrics")
+    if scope is not None:
+        scope.update(fields)
+
+def annotate_usage(usage):
+    if usage:
+        annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+def mark_fast_path(kind):
+    metrics.inc("insight_fast_path_total", kind=kind)
+    annotate(fast_path=kind)
 
 def get_prev_period(period):
     if len(period) == 6 and period.isdigit():
@@ -21,18 +77,6 @@ def get_prev_period(period):
         return f"{year}{month:02d}"
     return ""
 
-def normalize_string(s):
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKD", str(s))
-    s = s.encode("ascii", "ignore").decode("ascii")
-    return re.sub(r'\s+', '', s.lower().strip())
-
-def friendly_fallback(value):
-    if value in (None, "", "null", "none", "N/A", "-", "NaN"):
-        return "Unable to get. Tip: Tap on Reports for month, category, payment, or payee breakdown."
-    return value
-
 def group_by_category(tx_list, period, type_value):
     summary = []
     for tx in tx_list:
@@ -47,20 +91,6 @@ def group_by_category(tx_list, period, type_value):
                 summary.append({"category": cat, "amount": amt, "count": 1})
     return summary
 
-def format_category_summary(summary):
-    return [{**item, "amount": f"₹{item['amount']:.2f}"} for item in summary]
-def fix_nulls_in_chat(resp_json):
-    # Patch: Replace 'null', None, '', with "₹0" or friendly fallback
-    if "chat" in resp_json and "entries" in resp_json["chat"]:
-        for entry in resp_json["chat"]["entries"]:
-            # Fix header
-            if entry.get("header") in (None, "", "null", "none", "-", "NaN"):
-                entry["header"] = "Info"
-            # Fix detail/text/value/amount
-            for key in ["detail", "text", "value", "amount"]:
-                if key in entry and entry[key] in (None, "", "null", "none", "-", "NaN"):
-                    entry[key] = "₹0"
-    return resp_json
 def group_by_merchant(tx_list, period, merchant_category=None):
     merchants = {}
     for tx in tx_list:
@@ -76,9 +106,6 @@ def group_by_merchant(tx_list, period, merchant_category=None):
                 merchants[m] = {"merchant": m, "amount": amt, "count": 1}
     return list(merchants.values())
 
-def format_merchant_summary(summary):
-    return [{**item, "amount": f"₹{item['amount']:.2f}"} for item in summary]
-
 def group_by_payment(tx_list, period):
     summary = {}
     for tx in tx_list:
@@ -89,183 +116,57 @@ def group_by_payment(tx_list, period):
             summary[method] += amt
     return [{"method": k, "amount": v} for k, v in summary.items()]
 
-def format_payment_summary(summary):
-    return [
-        {**item, "amount": f"₹{item['amount']:.2f}" if isinstance(item['amount'], (int, float)) else str(item['amount'])}
-        for item in summary
-    ]
-
-def generate_header_from_query(q, key_match=None):
-    q_lower = q.lower()
-    if key_match:
-        if any(word in q_lower for word in ["how much", "total", "spent", "cost"]):
-            return f"{key_match.strip().title()} Spend"
-        if any(word in q_lower for word in ["how many", "count", "order"]):
-            return f"{key_match.strip().title()} Order Count"
-        if any(word in q_lower for word in ["list", "show", "all", "details"]):
-            return f"{key_match.strip().title()} Details"
-        return f"{key_match.strip().title()} Query"
-    if "personal expense" in q_lower:
-        return "Personal Expense"
-    if "subscription" in q_lower:
-        return "Subscription Expense"
-    if "compare" in q_lower or "trend" in q_lower:
-        return "Comparison / Trend"
-    if "summary" in q_lower:
-        return "Expense Summary"
-    if "income" in q_lower:
-        return "Income Overview"
-    return q.strip().capitalize()[:40] or "Chat Query"
-
 def add_smart_help_tip(chat_response, user_query):
     if not chat_response or "entries" not in chat_response:
         return chat_response
-    q = user_query.lower()
-    help_tip = None
-    if any(kw in q for kw in ["download report", "export report", "save report", "report pdf"]):
-        help_tip = "Tip: Tap on the 'Report' page, then tap the PDF icon in the top-right corner to download/export your report."
-    elif any(kw in q for kw in ["download insight", "export insight", "insight pdf", "save insight"]):
-        help_tip = "Tip: Tap on the 'Insight' page, then tap the PDF icon in the top-right corner to download/export insights."
-    elif any(kw in q for kw in ["download transaction", "export transaction", "backup transaction", "download excel", "export excel", "save excel"]):
-        help_tip = "Tip: Go to Settings, then tap on 'Back up/Restore' to export your transactions as Excel files."
-    elif any(kw in q for kw in ["upload transaction", "restore transaction", "import transaction", "restore excel", "import excel"]):
-        help_tip = "Tip: Go to Settings, then tap on 'Back up/Restore' to upload/restore transactions from an Excel file."
-    elif "backup" in q:
-        help_tip = "Tip: The app will automatically back up your data daily to Google Cloud."
-    elif "import" in q and ("google pay" in q or "phonepe" in q or "screenshot" in q):
-        help_tip = "Tip: You can import Google Pay or PhonePe screenshots—use the import feature in the app for automatic transaction extraction."
-    elif any(kw in q for kw in ["payee", "person", "who", "to whom"]):
-        help_tip = "Tip: For transaction details, tap the payee in the Reports page for a full breakdown."
-    elif any(kw in q for kw in ["date wise", "by date", "datewise", "on which date", "all transactions", "each day"]):
-        help_tip = "Tip: For date-wise or date-related queries, tap the category or Payment in the Reports for a full breakdown."
-    elif any(kw in q for kw in ["category", "categorywise", "grouped by category"]):
-        help_tip = "Tip: For category details or summary queries, tap the category in the Reports for a full breakdown."
-    elif any(kw in q for kw in ["payment method", "upi", "cash", "card", "payment summary"]):
-        help_tip = "Tip: For payment details or summary queries, tap Payment in the Reports for a full breakdown."
-    elif any(kw in q for kw in ["month wise", "month summary", "monthly", "this month", "last month"]):
-        help_tip = "Tip: For month-wise or summary queries, tap the Month in the Reports for a full breakdown."
-    elif any(kw in q for kw in ["detail", "details", "summary"]):
-        help_tip = "Tip: For more details, explore the Reports page for a full breakdown."
+    tip = help_tip(user_query)
     entries = chat_response["entries"]
-    detailed = any(re.match(r"\d{4}-\d{2}-\d{2}", entry.get("header", "")) for entry in entries)
-    if help_tip and not detailed:
-        entries.append({"header": "", "detail": help_tip})
+    detailed = any(is_detailed_entry(entry) for entry in entries)
+    if tip and not detailed:
+        entries.append({"header": "", "detail": tip})
     return chat_response
 
-def normalize_chat_entries(entries):
-    normalized = []
-    for entry in entries:
-        if isinstance(entry, dict):
-            if "amount" in entry and "category" in entry:
-                normalized.append({
-                    "header": friendly_fallback(entry.get("category", "")),
-                    "detail": friendly_fallback(entry.get("amount", ""))
-                })
-            elif "title" in entry and "value" in entry:
-                value = entry["value"]
-                if isinstance(value, list):
-                    value = "\n".join(str(v) for v in value)
-                normalized.append({
-                    "header": friendly_fallback(entry.get("title", "")),
-                    "detail": friendly_fallback(value)
-                })
-            elif "content" in entry:
-                normalized.append({
-                    "header": friendly_fallback(entry.get("type", "")),
-                    "detail": friendly_fallback(entry.get("content", ""))
-                })
-            elif "detail" in entry and "header" in entry:
-                normalized.append({
-                    "header": friendly_fallback(entry.get("header", "")),
-                    "detail": friendly_fallback(entry.get("detail", ""))
-                })
-            elif "text" in entry:
-                normalized.append({
-                    "header": "",
-                    "detail": friendly_fallback(entry.get("text", ""))
-                })
-            else:
-                normalized.append({
-                    "header": "",
-                    "detail": friendly_fallback(", ".join(str(v) for v in entry.values()))
-                })
-        else:
-            normalized.append({
-                "header": "",
-                "detail": friendly_fallback(str(entry))
-            })
-    if not normalized:
-        normalized.append({
-            "header": "",
-            "detail": "Unable to get this data. Tip: Try a different keyword or see Reports."
-        })
-    return normalized
+def aggregate_history(data, periods):
+    # One pass over the history for every requested period
+    if "transactions" not in data and data.get("user_id"):
+        # Server-side store: summaries come straight from the per-period rollups
+        return get_transaction_store().aggregate_periods(str(data["user_id"]), periods)
+    return aggregate_periods(data.get("transactions", []), periods)
 
-@app.route('/ai-insight', methods=['POST'])
-def ai_insight():
-    data = request.get_json()
-    tx_list = data.get("transactions", [])
+def build_insight_context(data, aggregated=None):
     period = data.get("period", "")
-    if not period:
-        return jsonify({"error": "Missing required field: period"}), 400
+    if aggregated is None:
+        # aggregated is already set when the request body was streamed in
+        aggregated = aggregate_history(data, [period, get_prev_period(period)])
+    return insight_context(data, period, aggregated)
 
+def insight_context(data, period, aggregated):
     prev_period = get_prev_period(period)
-    query = (data.get("query", "") or "").strip()
-    budget = data.get("budget", 0)
-    days_left = data.get("days_left", 0)
-    current_month_str = datetime.now().strftime("%Y%m")
-
-    # Build summaries
-    filtered_tx = [tx for tx in tx_list if tx.get("Period") == period]
-    filtered_tx_prev = [tx for tx in tx_list if tx.get("Period") == prev_period]
-    expense_summary = group_by_category(filtered_tx, period, 0)
-    income_summary = group_by_category(filtered_tx, period, 1)
-    merchant_summary = group_by_merchant(filtered_tx, period)
-    payment_summary = group_by_payment(filtered_tx, period)
-    expense_summary_prev = group_by_category(filtered_tx_prev, prev_period, 0)
-    income_summary_prev = group_by_category(filtered_tx_prev, prev_period, 1)
-    merchant_summary_prev = group_by_merchant(filtered_tx_prev, prev_period)
-    payment_summary_prev = group_by_payment(filtered_tx_prev, prev_period)
-
-
-  # ----- THIS IS THE CRITICAL PART -----
-    expense_total = sum(item['amount'] for item in expense_summary)
-    income_total = sum(item['amount'] for item in income_summary)
-    expense_total_prev = sum(item['amount'] for item in expense_summary_prev)
-    income_total_prev = sum(item['amount'] for item in income_summary_prev)
-
-    # Format for display only
-    expense_summary_fmt = format_category_summary(expense_summary)
-    expense_summary_prev_fmt = format_category_summary(expense_summary_prev)
-    income_summary_fmt = format_category_summary(income_summary)
-    income_summary_prev_fmt = format_category_summary(income_summary_prev)
-    merchant_summary_fmt = format_merchant_summary(merchant_summary)
-    merchant_summary_prev_fmt = format_merchant_summary(merchant_summary_prev)
-    payment_summary_fmt = format_payment_summary(payment_summary)
-    payment_summary_prev_fmt = format_payment_summary(payment_summary_prev)
-
+    return {
+        "period": period,
+        "prev_period": prev_period,
+        "query": (data.get("query", "") or "").strip(),
+        "budget": data.get("budget", 0),
+        "days_left": data.get("days_left", 0),
+        "current_month": datetime.now().strftime("%Y%m"),
+        "current": aggregated[period],
+        "previous": aggregated[prev_period],
+    }
+
+def quick_insight_response(ctx):
+    query = ctx["query"]
 
     # Optional: Still handle "below X" quick queries yourself for speed/UI
-    m_below = re.search(r"(below|under|less than|upto|micro\-spend|microspend|small)\s*₹?\s*([0-9]+)", query.lower())
-    if m_below:
-        amount_limit = int(m_below.group(2)) if m_below.group(2).isdigit() else 500
-        matches = [tx for tx in filtered_tx if tx.get("Amount", 0) < amount_limit]
-        entry_list = [{
-            "header": tx.get("Merchant") or tx.get("Transaction") or tx.get("Category") or tx.get("Method") or "",
-            "detail": f"₹{tx.get('Amount', 0):,.2f} on {tx.get('Date') or f'Period {tx.get('Period', '')}'}"
-        } for tx in matches]
-        resp = {
-            "chat": {
-                "header": f"Transactions Below ₹{amount_limit}",
-                "entries": entry_list if entry_list else [{"header": "", "detail": f"No transactions below ₹{amount_limit} for {period}."}]
-            }
-        }
-        resp["chat"] = add_smart_help_tip(resp["chat"], query)
-        return jsonify(resp)
-
-    # If there are NO transactions, respond as empty
-    if not filtered_tx or (not expense_summary and not income_summary):
-        return jsonify({
+    chat = below_answer(ctx, query.lower())
+    if chat:
+        local_answers.record("below")
+        mark_fast_path("below")
+        return {"chat": add_smart_help_tip(chat, query)}, 200
+
+    # (an empty period always has empty summaries, so no need to touch its transactions here)
+    if not ctx["current"]["expense_summary"] and not ctx["current"]["income_summary"]:
+        mark_fast_path("no_data")
+        return {
             "insight_groups": [{
                 "header": "No Data",
                 "detail": "No transactions found for the selected period.",
@@ -273,10 +174,110 @@ def ai_insight():
                 "category": "None",
                 "transactions": []
             }]
-        }), 200
+        }, 200
+
+    # Totals, counts, top-N, lookups, comparisons and date ranges come straight from the summaries
+    if query:
+        intent, chat = answer_query(ctx, query_header)
+        local_answers.record(intent)
+        if intent:
+            mark_fast_path(intent)
+            return {"chat": add_smart_help_tip(chat, query)}, 200
+    return None
+
+def insight_plan(ctx, no_cache=False):
+    # Fast path, cache lookup and prompt. Returns ((payload, status), None) when answered
+    # without a completion, else (None, plan); plan["messages"] is None on a cache hit.
+    with span("fast_path"):
+        quick = quick_insight_response(ctx)
+    if quick:
+        return quick, None
+
+    cache_key = insight_cache_key(ctx)
+    if no_cache:
+        insight_cache.bypass()
+        response_text = None
+    else:
+        response_text = insight_cache.get(cache_key)
+
+    from_cache = response_text is not None
+    annotate(cache="hit" if from_cache else "miss")
+    plan = {"cache_key": cache_key, "from_cache": from_cache, "response_text": response_text, "messages": None}
+    if not from_cache:
+        try:
+            with span("prompt"):
+                plan["messages"] = insight_messages(build_insight_prompt(ctx))
+        except Exception as e:
+            return llm_error(e), None
+    return None, plan
+
+def llm_error(e):
+    return {"error": str(e)}, e.status if isinstance(e, LLMError) else 500
+
+def accept_completion(plan, chat_completion):
+    annotate_usage(getattr(chat_completion, "usage", None))
+    plan["response_text"] = chat_completion.choices[0].message.content
+    record_raw_response(plan["response_text"])
+
+def complete_insight(ctx, plan):
+    # gpt-4o (unless the plan came from the cache), then postprocessing; returns (payload, status)
+    if plan["messages"] is not None:
+        try:
+            with span("llm"):
+                chat_completion = llm.complete(plan["messages"], **INSIGHT_COMPLETION)
+            accept_completion(plan, chat_completion)
+        except Exception as e:
+            return llm_error(e)
+    return finish_insight(ctx, plan)
+
+def finish_insight(ctx, plan):
+    response_text = plan["response_text"]
+    with span("postprocess"):
+        try:
+            resp_json, report = parse_response(response_text)
+        except ResponseParseError as e:
+            metrics.inc("insight_parse_errors_total")
+            return {
+                "parse_error": str(e),
+                "raw_response": response_text
+            }, 500
+        # repaired output is usually a truncated completion: serve it, but let the next request retry
+        if not plan["from_cache"] and not report["repaired"]:
+            insight_cache.set(plan["cache_key"], response_text)
+        plan["repaired"] = report["repaired"]
+        annotate(repaired=report["repaired"])
+        return finalize_insight_response(resp_json, ctx["query"]), 200
+
+def insight_result(ctx, no_cache=False):
+    # Fast path, then the cache, then gpt-4o; returns (payload, status)
+    answer, plan = insight_plan(ctx, no_cache)
+    if answer is not None:
+        return answer
+    return complete_insight(ctx, plan)
+
+def build_insight_prompt(ctx):
+    facts = format_fact_table(compute_facts(ctx))
+    prompt, report = fit_prompt(ctx, lambda blocks: render_insight_prompt(ctx, {**blocks, "facts": facts}))
+    app.logger.debug("insight prompt: %(tokens)s tokens, %(tokens_saved)s saved", report)
+    return prompt
+
+def render_insight_prompt(ctx, blocks):
+    period = ctx["period"]
+    prev_period = ctx["prev_period"]
+    query = ctx["query"]
+    # precomputed jobs leave budget/days_left out; the budget group is added when served
+    budget = ctx["budget"] if ctx["budget"] is not None else "not given (leave out Budget Alert/Remaining)"
+    days_left = ctx["days_left"] if ctx["days_left"] is not None else "not given"
+    current_month_str = ctx["current_month"]
+    current, previous = ctx["current"], ctx["previous"]
+
+    expense_total = current["expense_total"]
+    income_total = current["income_total"]
+    expense_total_prev = previous["expense_total"]
+    income_total_prev = previous["income_total"]
 
     # --- Let GPT handle ALL other queries (chat and insights, any type) ---
-    prompt = f"""
+    return f"""
 You are a finance insight assistant for a personal expense tracker.
 
 - Only use the provided summaries/data blocks for your analysis.
@@ -308,14 +309,14 @@ Required insight_groups (include only if relevant data is available):
 - Cash Flow
 - Expense Comparison (Only if both periods have matching data)
 - Spending Pattern Insights Comparison
-- High Spend Category (Top 3 categories by amount)
-- Biggest Single Transactions (Top 3 by amount, include details)
-- Category Comparison with previous period
+- High Spend Category (Top 3 categories by amount, use top_categories)
+- Biggest Single Transactions (Top 3 by amount, include details, use top_transactions)
+- Category Comparison with previous period (use category_changes)
 - Merchant-Insights (for the specified category, use merchant_summary)
 - Repeated Merchant Spend
 - Avoidable Spending Suggestions 
 - Transaction Frequency
-- Recurring Micro-Spends
+- Recurring Micro-Spends (use recurring_micro_spends)
 - Spending Control Encouragement
 - Expense Density Map
 - Predictive/Recurring Bills 
@@ -325,23 +326,21 @@ Required insight_groups (include only if relevant data is available):
 - 2-3 Optional trends/alerts (including you can invent new)
 
 **If both the current and previous period summaries have data, you MUST always include:**
-- An "Expense Comparison" section comparing total expenses between the two periods.
-- A "Category Comparison" section listing which categories increased, decreased, or appeared/disappeared (with amounts and counts in the format).
-- A "Merchant Comparison" section comparing merchant spending between the two periods (with details if merchant data is present).
-- A "Payment Comparison" section comparing Payment spending between the two periods (with details if Payment data is present).
+- An "Expense Comparison" section comparing total expenses between the two periods (use expense_change).
+- A "Category Comparison" section listing which categories increased, decreased, or appeared/disappeared (with amounts and counts in the format, use category_changes).
+- A "Merchant Comparison" section comparing merchant spending between the two periods (use merchant_changes).
+- A "Payment Comparison" section comparing Payment spending between the two periods (use payment_changes).
 
 **For Unusual/Anomaly Alerts:**
 - The "Unusual/Anomaly Alerts" section must always be present in insight_groups, even if it only says "No anomalies detected".
-- Always compare every category’s expense for the current and previous period, including small categories.
-- If any category’s spending has increased sharply compared to the previous period (for example, by more than 50%, or any large jump in amount or number of entries), you MUST include an "Anomaly" or "Unusual Spend" alert in the insight_groups.
-- Do not ignore small categories—if a category’s percentage increase is high (even if the total spend is small), you must include it as an anomaly.
+- The anomalies fact already lists every category whose spending rose more than 50%, doubled in entries, or is new this period. Do not recompute it.
+- You MUST include an "Anomaly" or "Unusual Spend" alert in the insight_groups for every row in anomalies, including small categories, each as a separate alert.
 - Always show both the absolute amount increase and the percentage increase for each anomaly.
-- Include all categories that meet this rule, not just the largest or top ones.
-- If multiple categories have sharp increases, list them all as separate alerts in the output.
 - Clearly state the category name, this period’s amount and count, and the previous period’s amount and count, using the required format (“₹{{{{amt}}}} at {{{{category}}}} ({{{{count}}}} entries)”).
 - Explicitly mention the percentage or amount increase and call it out as unusual or unexpected.
 - Example: "Unusually high spending in Utility this month: ₹1200 (6 entries), up from ₹200 (2 entries) last month, +500%."
-- If no category shows a significant increase, you MUST output an alert: "No anomalies detected" for that period.
+- If anomalies is "none", you MUST output an alert: "No anomalies detected" for that period.
+- Keep each detail to one or two sentences; the facts are already computed, so narrate them instead of re-deriving numbers.
 
 You are encouraged to invent and generate any other creative or AI-powered financial insights if relevant, using only the summaries provided. Go beyond the required list above if you see unique patterns, opportunities, or helpful suggestions.
 
@@ -358,25 +357,31 @@ budget: {budget}
 days_left: {days_left}
 current_month: {current_month_str}
 
+Summary rows are written as name|amount|count separated by ";" (payment rows: method|amount).
+Only the largest merchants/categories are listed; "Other (k merchants)" rows hold the rest. Totals below are exact.
+
+# FACTS (precomputed from the summaries; use these numbers as given)
+{blocks["facts"]}
+
 # EXPENSE
-category_summary: {json.dumps(expense_summary_fmt, separators=(',', ':'))}
-category_summary_prev: {json.dumps(expense_summary_prev_fmt, separators=(',', ':'))}
+category_summary: {blocks["category_summary"]}
+category_summary_prev: {blocks["category_summary_prev"]}
 expense_total: ₹{expense_total:,}
 expense_total_prev: ₹{expense_total_prev:,}
 
 # INCOME
-income_summary: {json.dumps(income_summary_fmt, separators=(',', ':'))}
-income_summary_prev: {json.dumps(income_summary_prev_fmt, separators=(',', ':'))}
+income_summary: {blocks["income_summary"]}
+income_summary_prev: {blocks["income_summary_prev"]}
 income_total: ₹{income_total:,}
 income_total_prev: ₹{income_total_prev:,}
 
 # MERCHANT
-merchant_summary: {json.dumps(merchant_summary_fmt, separators=(',', ':'))}
-merchant_summary_prev: {json.dumps(merchant_summary_prev_fmt, separators=(',', ':'))}
+merchant_summary: {blocks["merchant_summary"]}
+merchant_summary_prev: {blocks["merchant_summary_prev"]}
 
 # PAYMENT
-payment_summary: {json.dumps(payment_summary_fmt, separators=(',', ':'))}
-payment_summary_prev: {json.dumps(payment_summary_prev_fmt, separators=(',', ':'))}
+payment_summary: {blocks["payment_summary"]}
+payment_summary_prev: {blocks["payment_summary_prev"]}
 
 
 User's question:
@@ -404,41 +409,440 @@ If the user's query is a request for insights or analytics, answer it in this fo
 
 You may respond with both "chat" and "insight_groups" if appropriate. Use only the summaries above for all answers. Never use any data except what is provided above.
 """
+
+def insight_cache_key(ctx):
+    current, previous = ctx["current"], ctx["previous"]
+    return canonical_digest({
+        "model": "gpt-4o",
+        "period": ctx["period"],
+        "prev_period": ctx["prev_period"],
+        "budget": ctx["budget"],
+        "days_left": ctx["days_left"],
+        "current_month": ctx["current_month"],
+        "query": normalize_query(ctx["query"]),
+        "current": [current[key] for key in SUMMARY_KEYS],
+        "previous": [previous[key] for key in SUMMARY_KEYS],
+        "transaction_facts": transaction_facts(ctx),
+    })
+
+def insight_messages(prompt):
+    return [
+        {"role": "system", "content": "You are a smart finance assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+def finalize_insight_response(resp_json, query):
+    # resp_json comes from parse_response, so "chat" (when present) is a dict with an entries list
+    chat = resp_json.get("chat")
+    if chat is not None:
+        matched = match_query(query)
+        if not chat.get("header"):
+            chat["header"] = query_header(query, matched=matched)
+        chat["entries"], detailed = process_entries(chat["entries"])
+        if matched["tip"] and not detailed:
+            chat["entries"].append({"header": "", "detail": matched["tip"]})
+    return resp_json
+
+def streams_body():
+    return request.is_json and (request.content_length or 0) >= INGEST_STREAM_MIN_BYTES
+
+def load_insight_request():
+    # Large uploads are parsed incrementally: only period/prev_period rows are kept
+    if streams_body():
+        return read_insight_request(request.stream, lambda p: [p, get_prev_period(p)], request.args.get("period"))
+    return request.get_json(), None
+
+@app.route('/ai-insight', methods=['POST'])
+def ai_insight():
+    response, pending = start_insight_request()
+    if response is not None:
+        return response
+    resp_json, status = complete_insight(*pending)
+    return jsonify(resp_json), status
+
+def start_insight_request():
+    # /ai-insight up to the completion (shared with asgi.py): returns (response, None) when
+    # the request is answered without gpt-4o, else (None, (ctx, plan)) for complete_insight
     try:
-        chat_completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a smart finance assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.65
-        )
-        response_text = chat_completion.choices[0].message.content
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-    response_text = response_text.strip()
-    if response_text.startswith("```json"):
-        response_text = response_text[7:].strip("`").strip()
-    elif response_text.startswith("```"):
-        response_text = response_text[3:].strip("`").strip()
+        with span("parse"):
+            data, aggregated = load_insight_request()
+    except IngestError as e:
+        return (jsonify({"error": str(e)}), 400), None
+    if not data.get("period", ""):
+        return (jsonify({"error": "Missing required field: period"}), 400), None
+
+    with span("aggregate"):
+        ctx = build_insight_context(data, aggregated)
+    ready = precomputed_insight(data, ctx)
+    if ready is not None:
+        return jsonify(ready), None
+    answer, plan = insight_plan(ctx, data.get("no_cache"))
+    if answer is not None:
+        return (jsonify(answer[0]), answer[1]), None
+    return None, (ctx, plan)
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route('/ai-insight/stream', methods=['POST'])
+def ai_insight_stream():
+    try:
+        with span("parse"):
+            data, aggregated = load_insight_request()
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    if not data.get("period", ""):
+        return jsonify({"error": "Missing required field: period"}), 400
 
+    with span("aggregate"):
+        ctx = build_insight_context(data, aggregated)
+    query = ctx["query"]
+    with span("fast_path"):
+        quick = quick_insight_response(ctx)
+    cache_key = insight_cache_key(ctx)
+    cached = None
+    if not quick:
+        if data.get("no_cache"):
+            insight_cache.bypass()
+        else:
+            cached = insight_cache.get(cache_key)
+        annotate(cache="hit" if cached is not None else "miss")
+
+    def generate():
+        if quick:
+            yield sse_event("result", quick[0])
+            yield sse_event("done", {})
+            return
+
+        if cached is not None:
+            resp_json = finalize_insight_response(parse_response(cached)[0], query)
+            for group in resp_json.get("insight_groups", []):
+                yield sse_event("insight", group)
+            chat = resp_json.get("chat")
+            if isinstance(chat, dict):
+                for entry in chat.get("entries", []):
+                    yield sse_event("chat_entry", entry)
+            yield sse_event("done", {"chat_header": chat.get("header")} if isinstance(chat, dict) else {})
+            return
+
+        # Each insight group / chat entry is post-processed and sent as soon as it parses
+        parser = EntryStreamParser()
+        chat_entries = 0
+        detailed = False
+        try:
+            with span("prompt"):
+                messages = insight_messages(build_insight_prompt(ctx))
+            # "llm" covers the whole stream, including per-entry post-processing
+            with span("llm"):
+                stream = llm.stream(messages, stream_options={"include_usage": True}, **INSIGHT_COMPLETION)
+                for chunk in stream:
+                    # usage arrives on a final chunk with no choices
+                    annotate_usage(getattr(chunk, "usage", None))
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    for kind, item in parser.feed(chunk.choices[0].delta.content):
+                        if kind == "insight":
+                            group, _ = validate_group(item)
+                            if group is not None:
+                                yield sse_event("insight", group)
+                            continue
+                        entry = normalize_entry(fix_null_entry(item))
+                        chat_entries += 1
+                        detailed = detailed or is_detailed_entry(entry)
+                        yield sse_event("chat_entry", entry)
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        response_text = parser.text
+        record_raw_response(response_text)
+        try:
+            resp_json, report = parse_response(response_text)
+        except ResponseParseError as e:
+            metrics.inc("insight_parse_errors_total")
+            yield sse_event("error", {"parse_error": str(e), "raw_response": response_text})
+            return
+        if not report["repaired"]:
+            insight_cache.set(cache_key, response_text)
+
+        chat = resp_json.get("chat")
+        if isinstance(chat, dict) and "entries" in chat:
+            if not chat_entries:
+                yield sse_event("chat_entry", EMPTY_CHAT_ENTRY)
+            matched = match_query(query)
+            if matched["tip"] and not detailed:
+                yield sse_event("chat_entry", {"header": "", "detail": matched["tip"]})
+            yield sse_event("done", {"chat_header": chat.get("header") or query_header(query, matched=matched)})
+        else:
+            yield sse_event("done", {})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def batch_periods(periods):
+    # Every requested month plus the months before them; a month's summaries double as the next month's "prev"
+    if not isinstance(periods, list):
+        return []
+    wanted = {}
+    for period in periods:
+        if isinstance(period, str) and period:
+            wanted[period] = None
+            wanted[get_prev_period(period)] = None
+    return list(wanted)
+
+def load_batch_request():
+    if streams_body():
+        return read_insight_request(request.stream, batch_periods, period_key="periods", list_keys=("users",))
+    return request.get_json(), None
+
+def batch_item(index, build, no_cache):
+    # Runs in the batch pool; a fresh app context keeps spans and annotations off the request's g
+    with app.app_context():
+        try:
+            item, ctx = build()
+            if ctx is None:
+                return {**item, "index": index, "status": 400, "result": {"error": "Missing required field: period"}}
+            result, status = insight_result(ctx, no_cache)
+        except Exception as e:
+            item, result, status = {}, {"error": str(e)}, 500
+    return {**item, "index": index, "status": status, "result": result}
+
+def user_item(payload):
+    if not isinstance(payload, dict):
+        return {}, None
+    item = {key: payload[key] for key in ("user_id", "period") if payload.get(key) is not None}
+    if not payload.get("period"):
+        return item, None
+    return item, build_insight_context(payload)
+
+@app.route('/ai-insight/batch', methods=['POST'])
+def ai_insight_batch():
+    # {"periods": [...], "transactions": [...]} or {"periods": [...], "user_id": ...} for one history,
+    # or {"users": [{...an /ai-insight body...}, ...]}; results stream back as NDJSON as they finish
+    try:
+        with span("parse"):
+            data, aggregated = load_batch_request()
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    users, periods = data.get("users"), data.get("periods")
+    if users is not None:
+        if not isinstance(users, list):
+            return jsonify({"error": "users must be a list"}), 400
+        builds = [lambda payload=payload: user_item(payload) for payload in users]
+    elif periods:
+        periods = list(dict.fromkeys(p for p in periods if isinstance(p, str) and p)) if isinstance(periods, list) else []
+        if not periods:
+            return jsonify({"error": "periods must be a list of YYYYMM strings"}), 400
+        if aggregated is None:
+            with span("aggregate"):
+                aggregated = aggregate_history(data, batch_periods(periods))
+        item = {"user_id": data["user_id"]} if data.get("user_id") is not None else {}
+        builds = [lambda period=period: ({**item, "period": period}, insight_context(data, period, aggregated))
+                  for period in periods]
+    else:
+        return jsonify({"error": "Missing required field: periods or users"}), 400
+    if len(builds) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+    no_cache = data.get("no_cache")
+
+    def generate():
+        pool = ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(builds))))
+        try:
+            futures = [pool.submit(batch_item, index, build, no_cache) for index, build in enumerate(builds)]
+            for future in as_completed(futures):
+                yield json.dumps(future.result(), ensure_ascii=False) + "\n"
+        finally:
+            # a client that disconnects early cancels the items not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def job_queue():
+    return get_job_queue(run_insight_job)
+
+def job_context(user_id, period):
+    # Jobs depend on the stored data only: budget and days_left come with each request
+    # (and days_left changes daily), so they are left out of the prompt and the digest
+    return build_insight_context({"user_id": user_id, "period": period, "budget": None, "days_left": None})
+
+def job_digest(ctx):
+    return insight_cache_key({**ctx, "budget": None, "days_left": None})
+
+def run_insight_job(job):
+    # Worker thread: the no-query insight /ai-insight would produce for a store-backed user,
+    # apart from the budget group
+    with app.app_context():
+        ctx = job_context(job["user_id"], job["period"])
+        answer, plan = insight_plan(ctx)
+        result, status = answer if answer is not None else complete_insight(ctx, plan)
+    if status != 200:
+        raise RuntimeError(result.get("error") or result.get("parse_error") or f"status {status}")
+    if plan is not None and plan.get("repaired"):
+        # a repaired (truncated) completion would be served until the data changes; retry it
+        raise RuntimeError("model output was truncated and repaired")
+    return result
+
+def recent_periods(months):
+    periods = [datetime.now().strftime("%Y%m")]
+    while len(periods) < months:
+        periods.append(get_prev_period(periods[-1]))
+    return periods
+
+def enqueue_insight_jobs(user_id, periods):
+    # Only recent months with data are precomputed; older ones are generated on demand
+    if not JOB_WORKERS:
+        return []
+    jobs = []
+    for period in recent_periods(INSIGHT_JOB_MONTHS):
+        if period not in periods:
+            continue
+        ctx = job_context(user_id, period)
+        if not ctx["current"]["expense_summary"] and not ctx["current"]["income_summary"]:
+            continue
+        jid, status = job_queue().enqueue(user_id, period, job_digest(ctx))
+        jobs.append({"id": jid, "period": period, "status": status})
+    return jobs
+
+def precomputed_insight(data, ctx):
+    # Store-backed, no-query requests are served from a finished job for the same data,
+    # whatever their budget/days_left; the budget group is computed here from the request
+    if not JOB_WORKERS or ctx["query"] or data.get("no_cache") or "transactions" in data or not data.get("user_id"):
+        return None
+    job = job_queue().get(job_id(str(data["user_id"]), ctx["period"], job_digest(ctx)))
+    if job is None or job["status"] != "done":
+        return None
+    annotate(cache="job")
+    result = job["result"]
+    group = budget_group(ctx)
+    if group is not None:
+        groups = [g for g in result.get("insight_groups", []) if "budget" not in g.get("header", "").lower()]
+        result = {**result, "insight_groups": [group] + groups}
+    return result
+
+def job_response(job):
+    body = {key: job[key] for key in ("id", "user_id", "period", "status", "created", "updated")}
+    if job["status"] == "done":
+        body["result"] = job["result"]
+    elif job["status"] == "error":
+        body["error"] = job["error"]
+    return jsonify(body), 202 if job["status"] in ("pending", "running") else 200
+
+@app.route('/insight-jobs', methods=['POST'])
+def create_insight_job():
+    data = request.get_json()
+    if not data.get("user_id") or not data.get("period"):
+        return jsonify({"error": "Missing required fields: user_id, period"}), 400
+    if not JOB_WORKERS:
+        return jsonify({"error": "Insight jobs are disabled"}), 503
+    user_id = str(data["user_id"])
+    ctx = job_context(user_id, data["period"])
+    jid, _ = job_queue().enqueue(user_id, ctx["period"], job_digest(ctx))
+    return job_response(job_queue().get(jid))
+
+@app.route('/insight-jobs/<jid>', methods=['GET'])
+def get_insight_job(jid):
+    job = job_queue().get(jid)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return job_response(job)
+
+@app.route('/insight-jobs', methods=['GET'])
+def latest_insight_job():
+    user_id, period = request.args.get("user_id"), request.args.get("period")
+    if not user_id or not period:
+        return jsonify({"error": "Missing required query parameters: user_id, period"}), 400
+    job = job_queue().latest(user_id, period)
+    if job is None:
+        return jsonify({"error": "No job for this user and period"}), 404
+    return job_response(job)
+
+@app.route('/transactions', methods=['POST'])
+def upsert_transactions():
+    if streams_body():
+        return upsert_transactions_streamed()
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    user_id = data.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing required field: user_id"}), 400
+    tx_list = data.get("transactions", [])
+    if not isinstance(tx_list, list):
+        return jsonify({"error": "transactions must be a list"}), 400
     try:
-        resp_json = json.loads(response_text)
-    except Exception as e:
-        return jsonify({
-            "parse_error": str(e),
-            "raw_response": response_text
-        }), 500
-
-    resp_json = fix_nulls_in_chat(resp_json)
-
-    if "chat" in resp_json and "entries" in resp_json["chat"]:
-        if not resp_json["chat"].get("header"):
-            resp_json["chat"]["header"] = generate_header_from_query(query)
-        resp_json["chat"]["entries"] = normalize_chat_entries(resp_json["chat"]["entries"])
-        resp_json["chat"] = add_smart_help_tip(resp_json["chat"], query)
-    return jsonify(resp_json)
+        tx_ids = get_transaction_store().upsert(str(user_id), tx_list)
+    except InvalidTransaction as e:
+        return jsonify({"error": str(e)}), 400
+    jobs = enqueue_insight_jobs(str(user_id), {tx["Period"] for tx in tx_list})
+    return jsonify({"upserted": len(tx_ids), "ids": tx_ids, "jobs": jobs})
+
+def upsert_transactions_streamed():
+    # Bulk restores: rows are checked and staged as they arrive instead of loading the
+    # whole body, then written in one transaction once the body is complete
+    user_id, periods = None, set()
+    try:
+        with closing(get_transaction_store().stage()) as upload:
+            for kind, key, value in iter_body(request.stream):
+                if kind == "field" and key == "user_id":
+                    user_id = value
+                elif kind == "item":
+                    upload.add(value)
+                    periods.add(value["Period"])
+            if not user_id:
+                return jsonify({"error": "Missing required field: user_id"}), 400
+            tx_ids = upload.commit(str(user_id))
+    except (IngestError, InvalidTransaction) as e:
+        return jsonify({"error": str(e)}), 400
+    jobs = enqueue_insight_jobs(str(user_id), periods)
+    return jsonify({"upserted": len(tx_ids), "ids": tx_ids, "jobs": jobs})
+
+@app.route('/transactions', methods=['DELETE'])
+def delete_transactions():
+    data = request.get_json()
+    user_id = data.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing required field: user_id"}), 400
+    deleted = get_transaction_store().delete(str(user_id), data.get("ids", []))
+    return jsonify({"deleted": deleted})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    body = {"cache": insight_cache.stats(), "local_answers": local_answers.snapshot(),
+            "prompt": prompt_builder.snapshot(), "llm": llm.stats(), "jobs": job_stats(),
+            "responses": response_parser.snapshot()}
+    if async_llm is not None:
+        body["llm_async"] = async_llm.stats()
+    return jsonify(body)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Per-process registry: with several gunicorn workers each scrape sees one worker
+    cache = insight_cache.stats()
+    answers = local_answers.snapshot()
+    prompt = prompt_builder.snapshot()
+    in_flight = llm.stats()["in_flight"] + (async_llm.stats()["in_flight"] if async_llm is not None else 0)
+    extra = {
+        "insight_cache_events_total": ("Insight cache lookups and writes", "counter", [
+            ({"event": event}, cache[event])
+            for event in ("hits", "disk_hits", "misses", "bypasses", "evictions", "expirations", "sets")]),
+        "insight_cache_entries": ("Entries in the in-memory insight cache", "gauge", [({}, cache["entries"])]),
+        "insight_cache_bytes": ("Bytes held by the in-memory insight cache", "gauge", [({}, cache["bytes"])]),
+        "local_answer_queries_total": ("Chat queries by intent; intent=\"llm\" went to GPT", "counter",
+                                       [({"intent": intent}, count) for intent, count in answers["intents"].items()]
+                                       + [({"intent": "llm"}, answers["llm"])]),
+        "llm_in_flight": ("Chat completions currently holding a gateway slot", "gauge", [({}, in_flight)]),
+        "insight_jobs": ("Precomputation jobs by status", "gauge",
+                         [({"status": status}, count) for status, count in job_stats().items() if status != "workers"]),
+        "prompt_builds_total": ("Insight prompts built", "counter", [({}, prompt["prompts"])]),
+        "prompt_tokens_total": ("Estimated tokens in built prompts", "counter", [({}, prompt["tokens"])]),
+        "prompt_tokens_saved_total": ("Tokens removed by prompt compaction", "counter", [({}, prompt["tokens_saved"])]),
+        "prompt_over_budget_total": ("Prompts still over PROMPT_TOKEN_BUDGET at the minimum top-N", "counter",
+                                     [({}, prompt["over_budget"])]),
+    }
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
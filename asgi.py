@@ -0,0 +1,171 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from flask import g, jsonify
+
+import app as insight_app
+from ingest import INGEST_STREAM_MIN_BYTES
+import metrics
+from llm_gateway import AsyncLLMGateway, build_async_client
+
+# Async serving mode: gunicorn -k uvicorn_worker.UvicornWorker asgi:application
+# (SERVE_MODE=async in gunicorn.conf.py). POST /ai-insight runs on the event loop:
+# parsing, aggregation, prompt building and postprocessing go to a thread pool and
+# the completion is awaited on AsyncOpenAI, so a request waiting on gpt-4o holds no
+# thread. Every other route is the Flask app, run on a2wsgi's own thread pool.
+ASYNC_CPU_THREADS = int(os.environ.get("ASYNC_CPU_THREADS", 4))
+ASYNC_WSGI_THREADS = int(os.environ.get("ASYNC_WSGI_THREADS", 16))
+
+flask_app = insight_app.app
+llm = insight_app.async_llm = AsyncLLMGateway(build_async_client())
+cpu_pool = ThreadPoolExecutor(max_workers=ASYNC_CPU_THREADS, thread_name_prefix="insight-cpu")
+wsgi = WSGIMiddleware(flask_app, workers=ASYNC_WSGI_THREADS)
+
+class RequestBody:
+    # wsgi.input for a pool thread: pulls body chunks from the event loop as they are
+    # read, so large uploads are still parsed incrementally (ingest.py)
+    def __init__(self, loop, receive):
+        self.loop = loop
+        self.receive = receive
+        self.buffer = bytearray()
+        self.more = True
+
+    def add(self, message):
+        if message["type"] == "http.disconnect":
+            raise OSError("client disconnected")
+        self.buffer += message.get("body", b"")
+        self.more = message.get("more_body", False)
+
+    async def fill(self, limit):
+        # Buffers up to limit bytes on the loop, so a pool thread never sits waiting
+        # on the client for an ordinary-sized body
+        while self.more and len(self.buffer) < limit:
+            self.add(await self.receive())
+
+    def pull(self):
+        self.add(asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result())
+
+    def read(self, size=-1):
+        while self.more and (size is None or size < 0 or len(self.buffer) < size):
+            self.pull()
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while self.more and b"\n" not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            self.pull()
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        return self.read(end if size is None or size < 0 else min(end, size))
+
+def request_environ(scope, body):
+    # WSGI environ (PEP 3333) for an ASGI HTTP scope
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    # without a Content-Length (chunked upload) the body runs until the last ASGI message
+    environ["wsgi.input_terminated"] = "CONTENT_LENGTH" not in environ
+    return environ
+
+def finalize(rv):
+    response = flask_app.make_response(rv)
+    return flask_app.process_response(response)
+
+def handle_error(e):
+    # Flask's own error path: HTTPExceptions (e.g. a malformed JSON body is a 400) and
+    # registered handlers via handle_user_exception, anything unhandled becomes a 500
+    try:
+        return finalize(flask_app.handle_user_exception(e))
+    except Exception as error:
+        return flask_app.handle_exception(error)
+
+def prepare_insight(environ):
+    # Pool thread: parse, aggregate, fast path, cache and prompt. Returns (response, None, None)
+    # when done, else (None, (ctx, plan), metrics scope) for the completion.
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is not None:
+                return finalize(rv), None, None
+            response, pending = insight_app.start_insight_request()
+            if response is not None:
+                return finalize(response), None, None
+            return None, pending, g.get("metrics")
+        except Exception as e:
+            return handle_error(e), None, None
+
+def finish_insight(environ, pending, scope, chat_completion, error):
+    # Pool thread: postprocess the completion under the request's metrics scope
+    with flask_app.request_context(environ):
+        g.metrics = scope
+        try:
+            ctx, plan = pending
+            if error is None and chat_completion is not None:
+                try:
+                    insight_app.accept_completion(plan, chat_completion)
+                except Exception as e:
+                    error = e
+            resp_json, status = insight_app.llm_error(error) if error is not None else insight_app.finish_insight(ctx, plan)
+            return finalize((jsonify(resp_json), status))
+        except Exception as e:
+            return handle_error(e)
+
+async def send_response(send, response):
+    try:
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response.get_data()})
+    finally:
+        response.close()
+
+async def ai_insight(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    body = RequestBody(loop, receive)
+    await body.fill(INGEST_STREAM_MIN_BYTES)
+    environ = request_environ(scope, body)
+    response, pending, metrics_scope = await loop.run_in_executor(cpu_pool, prepare_insight, environ)
+    if response is None:
+        chat_completion = error = None
+        messages = pending[1]["messages"]
+        if messages is not None:
+            try:
+                with metrics.span("llm", metrics_scope, cpu=False):
+                    chat_completion = await llm.complete(messages, **insight_app.INSIGHT_COMPLETION)
+            except Exception as e:
+                error = e
+        response = await loop.run_in_executor(cpu_pool, finish_insight, environ, pending, metrics_scope,
+                                              chat_completion, error)
+    await send_response(send, response)
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/ai-insight":
+        return await ai_insight(scope, receive, send)
+    return await wsgi(scope, receive, send)
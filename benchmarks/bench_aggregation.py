@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app import group_by_category, group_by_merchant, group_by_payment, get_prev_period
+from aggregation import aggregate_periods
+from benchmarks.synthetic import generate_transactions
+
+PERIOD = "202406"
+
+def legacy(tx_list, period, prev_period):
+    filtered_tx = [tx for tx in tx_list if tx.get("Period") == period]
+    filtered_tx_prev = [tx for tx in tx_list if tx.get("Period") == prev_period]
+    out = {}
+    for p, rows in ((period, filtered_tx), (prev_period, filtered_tx_prev)):
+        expense = group_by_category(rows, p, 0)
+        income = group_by_category(rows, p, 1)
+        out[p] = {
+            "expense_summary": expense,
+            "income_summary": income,
+            "merchant_summary": group_by_merchant(rows, p),
+            "payment_summary": group_by_payment(rows, p),
+            "expense_total": sum(item['amount'] for item in expense),
+            "income_total": sum(item['amount'] for item in income),
+            "transactions": rows,
+        }
+    return out
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    prev_period = get_prev_period(PERIOD)
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'rows':>10} {'legacy ms':>12} {'single-pass ms':>16} {'speedup':>8}")
+    for n in sizes:
+        tx_list = generate_transactions(n)
+        repeat = 5 if n <= 100_000 else 2
+        t_legacy, expected = best_of(lambda: legacy(tx_list, PERIOD, prev_period), repeat)
+        t_new, got = best_of(lambda: aggregate_periods(tx_list, [PERIOD, prev_period]), repeat)
+        assert got == expected, "single-pass output differs from legacy group_by_* output"
+        print(f"{n:>10} {t_legacy * 1000:>12.1f} {t_new * 1000:>16.1f} {t_legacy / t_new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
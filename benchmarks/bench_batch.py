@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.mock_openai import serve
+from benchmarks.synthetic import generate_transactions, month_periods
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    server, state, base_url = serve(latency=latency)
+    # the app builds its OpenAI client at import time, so point it at the mock first
+    os.environ["OPENAI_BASE_URL"] = base_url
+    import app
+
+    client = app.app.test_client()
+    tx_list = generate_transactions(rows, months=24)
+    periods = month_periods(12)
+    print(f"{rows} rows, 12 months, mock latency {latency}s, BATCH_CONCURRENCY={app.BATCH_CONCURRENCY}")
+
+    start = time.perf_counter()
+    for period in periods:
+        resp = client.post("/ai-insight", json={"period": period, "transactions": tx_list, "no_cache": True})
+        assert resp.status_code == 200, resp.json
+    sequential = time.perf_counter() - start
+    calls = state.snapshot()["requests"]
+    print(f"  12 x /ai-insight      {sequential:7.2f}s  upstream calls {calls}")
+
+    start = time.perf_counter()
+    first = None
+    resp = client.post("/ai-insight/batch", json={"periods": periods, "transactions": tx_list, "no_cache": True})
+    results = []
+    for line in resp.response:
+        results.append(json.loads(line))
+        first = first or time.perf_counter() - start
+    resp.close()
+    batch = time.perf_counter() - start
+    assert sorted(item["period"] for item in results) == sorted(periods)
+    assert all(item["status"] == 200 for item in results), results
+    print(f"  1 x /ai-insight/batch {batch:7.2f}s  upstream calls {state.snapshot()['requests'] - calls}  first result after {first:.2f}s")
+    print(f"  speedup {sequential / batch:.1f}x")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
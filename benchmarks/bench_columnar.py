@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aggregation import aggregate_periods
+from benchmarks.columnar import ColumnarTransactions
+from benchmarks.synthetic import generate_transactions
+
+PERIODS = ["202406", "202405"]
+LIMIT = 200
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def dict_path(tx_list):
+    aggregated = aggregate_periods(tx_list, PERIODS)
+    below = [tx for tx in aggregated[PERIODS[0]]["transactions"] if tx.get("Amount", 0) < LIMIT]
+    return aggregated, below
+
+def columnar_path(tx_list, periods=PERIODS):
+    table = ColumnarTransactions.from_records(tx_list, periods)
+    return table.aggregate_periods(PERIODS), table.below(PERIODS[0], LIMIT)
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'rows':>10} {'dict ms':>9} {'columnar ms':>12} {'group-only ms':>14} {'12mo dict ms':>13} {'12mo columnar ms':>17}")
+    for n in sizes:
+        tx_list = generate_transactions(n, merchants=2000)
+        repeat = 5 if n <= 100_000 else 2
+        t_dict, expected = best_of(lambda: dict_path(tx_list), repeat)
+        t_col, got = best_of(lambda: columnar_path(tx_list), repeat)
+        assert got == expected, "columnar output differs from the dict path"
+        # Group-bys and mask filters alone, on columns that are already built
+        table = ColumnarTransactions.from_records(tx_list, PERIODS)
+        t_group, _ = best_of(lambda: (table.aggregate_periods(PERIODS), table.below(PERIODS[0], LIMIT)), repeat)
+        # Batch-style use: one conversion serves every month
+        months = sorted({tx["Period"] for tx in tx_list})[-12:]
+        t_months_dict, expected = best_of(lambda: aggregate_periods(tx_list, months), repeat)
+        t_months_col, got = best_of(lambda: ColumnarTransactions.from_records(tx_list, months).aggregate_periods(months), repeat)
+        assert got == expected, "columnar output differs from the dict path"
+        print(f"{n:>10} {t_dict * 1000:>9.1f} {t_col * 1000:>12.1f} {t_group * 1000:>14.1f} {t_months_dict * 1000:>13.1f} {t_months_col * 1000:>17.1f}")
+
+if __name__ == "__main__":
+    main()
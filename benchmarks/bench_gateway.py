@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from llm_gateway import LLMGateway, build_client
+from benchmarks.mock_openai import serve
+
+def messages(i=0):
+    return [{"role": "system", "content": "You are a smart finance assistant."},
+            {"role": "user", "content": f"Insight prompt #{i}"}]
+
+def client_for(base_url):
+    os.environ["OPENAI_BASE_URL"] = base_url
+    return build_client()
+
+def run(fn, jobs, workers):
+    ok = errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for result in pool.map(lambda i: attempt(fn, i), range(jobs)):
+            ok += result
+            errors += not result
+    return ok, errors, time.perf_counter() - start
+
+def attempt(fn, i):
+    try:
+        fn(i)
+        return True
+    except Exception:
+        return False
+
+def coalescing(concurrency=50, latency=0.3):
+    print(f"== {concurrency} concurrent identical prompts, {latency}s upstream latency")
+    for label in ("raw client", "gateway"):
+        server, state, base_url = serve(latency=latency)
+        client = client_for(base_url)
+        if label == "gateway":
+            gateway = LLMGateway(client, max_in_flight=concurrency)
+            fn = lambda i: gateway.complete(messages(), model="gpt-4o", temperature=0.65)
+        else:
+            fn = lambda i: client.chat.completions.create(messages=messages(), model="gpt-4o", temperature=0.65)
+        ok, errors, elapsed = run(fn, concurrency, concurrency)
+        print(f"  {label:<10} upstream calls {state.snapshot()['requests']:>3}  ok {ok:>3}  errors {errors:>3}  {elapsed:.2f}s")
+        server.shutdown()
+
+def retries(jobs=200, fail_rate=0.3, status=429):
+    print(f"== {jobs} distinct prompts, {fail_rate:.0%} of upstream calls fail with {status}")
+    for label in ("raw client", "gateway"):
+        server, state, base_url = serve(latency=0.01, fail_rate=fail_rate, fail_status=status)
+        client = client_for(base_url)
+        if label == "gateway":
+            gateway = LLMGateway(client, max_in_flight=16, max_retries=3)
+            fn = lambda i: gateway.complete(messages(i), model="gpt-4o")
+        else:
+            fn = lambda i: client.chat.completions.create(messages=messages(i), model="gpt-4o")
+        ok, errors, elapsed = run(fn, jobs, 16)
+        print(f"  {label:<10} upstream calls {state.snapshot()['requests']:>4}  ok {ok:>4}  errors {errors:>4}  {elapsed:.2f}s")
+        server.shutdown()
+
+def concurrency_cap(jobs=64, cap=8, latency=0.1):
+    print(f"== {jobs} distinct prompts from {jobs} threads, gateway cap {cap}")
+    server, state, base_url = serve(latency=latency)
+    gateway = LLMGateway(client_for(base_url), max_in_flight=cap)
+    ok, errors, elapsed = run(lambda i: gateway.complete(messages(i), model="gpt-4o"), jobs, jobs)
+    print(f"  max concurrent upstream calls {state.snapshot()['max_concurrent']}  ok {ok}  errors {errors}  {elapsed:.2f}s")
+    server.shutdown()
+    server, state, base_url = serve(latency=latency)
+    deadline = latency * 2.5
+    gateway = LLMGateway(client_for(base_url), max_in_flight=cap, deadline=deadline)
+    ok, errors, elapsed = run(lambda i: gateway.complete(messages(i), model="gpt-4o"), jobs, jobs)
+    print(f"  with a {deadline:.2f}s deadline: ok {ok}  rejected {errors} (LLMBusy instead of queueing)  {elapsed:.2f}s")
+    server.shutdown()
+
+if __name__ == "__main__":
+    coalescing()
+    retries()
+    concurrency_cap()
@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aggregation import aggregate_periods
+from ingest import read_insight_request
+from benchmarks.synthetic import generate_transactions
+
+PERIOD, PREV_PERIOD = "202406", "202405"
+
+def periods_for(period):
+    return [PERIOD, PREV_PERIOD]
+
+def whole_body(path):
+    # What request.get_json() does: read the full body, then build every dict
+    with open(path, "rb") as f:
+        data = json.loads(f.read())
+    return aggregate_periods(data["transactions"], periods_for(data["period"]))
+
+def streamed(path):
+    with open(path, "rb") as f:
+        return read_insight_request(f, periods_for)[1]
+
+def measure(fn, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak / 1024 / 1024, elapsed
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or [50_000, 200_000, 500_000]
+    print(f"{'rows':>9} {'body MB':>8} {'get_json peak MB':>17} {'streamed peak MB':>17} {'get_json s':>11} {'streamed s':>11}")
+    for n in sizes:
+        body = {"period": PERIOD, "query": "", "transactions": generate_transactions(n)}
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(body, f)
+            path = f.name
+        del body
+        try:
+            expected, full_peak, full_s = measure(whole_body, path)
+            got, stream_peak, stream_s = measure(streamed, path)
+            assert got == expected, "streamed aggregation differs from the whole-body path"
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            print(f"{n:>9} {size_mb:>8.1f} {full_peak:>17.1f} {stream_peak:>17.1f} {full_s:>11.2f} {stream_s:>11.2f}")
+        finally:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    main()
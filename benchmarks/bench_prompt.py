@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import app
+from analytics import compute_facts, format_fact_table
+from prompt_builder import BLOCKS, estimate_tokens, fit_prompt
+from benchmarks.synthetic import generate_transactions
+
+# gpt-4o list price per 1M input tokens (USD); override with GPT4O_INPUT_PRICE
+INPUT_PRICE = float(os.environ.get("GPT4O_INPUT_PRICE", 2.50))
+
+def full_blocks(ctx):
+    # The uncompacted JSON blocks the prompt used to inline
+    blocks = {}
+    for name, period_key, summary_key, _, _ in BLOCKS:
+        rows = [{**item, "amount": f"₹{item['amount']:.2f}"} for item in ctx[period_key][summary_key]]
+        blocks[name] = json.dumps(rows, separators=(',', ':'))
+    return blocks
+
+def live_latency(prompt):
+    start = time.perf_counter()
+    app.client.chat.completions.create(model="gpt-4o", messages=app.insight_messages(prompt), temperature=0.65, max_tokens=1)
+    return time.perf_counter() - start
+
+def main():
+    live = "--live" in sys.argv
+    cardinalities = [int(s) for s in sys.argv[1:] if s.isdigit()] or [50, 500, 5000]
+    print(f"{'merchants':>10} {'full tokens':>12} {'est. full':>10} {'compact tokens':>15} {'saved':>7} {'full $/1k req':>14} {'compact $/1k req':>17} {'build ms':>9}"
+          + (f" {'full ttft s':>12} {'compact ttft s':>15}" if live else ""))
+    for merchants in cardinalities:
+        tx_list = generate_transactions(max(20_000, merchants * 20), months=2, merchants=merchants)
+        ctx = app.build_insight_context({"transactions": tx_list, "period": "202406", "query": ""})
+        full_prompt = app.render_insight_prompt(ctx, {**full_blocks(ctx), "facts": format_fact_table(compute_facts(ctx))})
+        start = time.perf_counter()
+        compact_prompt = app.build_insight_prompt(ctx)
+        build_ms = (time.perf_counter() - start) * 1000
+        # what /stats reports: fit_prompt's estimate from block lengths
+        facts = format_fact_table(compute_facts(ctx))
+        estimated = fit_prompt(ctx, lambda blocks: app.render_insight_prompt(ctx, {**blocks, "facts": facts}))[1]["full_tokens"]
+        full_tokens, compact_tokens = estimate_tokens(full_prompt), estimate_tokens(compact_prompt)
+        line = (f"{merchants:>10} {full_tokens:>12} {estimated:>10} {compact_tokens:>15} {1 - compact_tokens / full_tokens:>6.0%} "
+                f"{full_tokens * INPUT_PRICE / 1000:>14.2f} {compact_tokens * INPUT_PRICE / 1000:>17.2f} {build_ms:>9.1f}")
+        if live:
+            line += f" {live_latency(full_prompt):>12.2f} {live_latency(compact_prompt):>15.2f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
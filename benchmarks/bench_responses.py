@@ -0,0 +1,125 @@
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import app
+from query_rules import query_header
+from response_parser import ResponseParseError, fix_null_entry, normalize_entry, parse_response, strip_code_fences
+
+# Usage: bench_responses.py [recorded.jsonl]
+# A recorded corpus comes from running the app with RESPONSE_RECORD_PATH set. Without
+# one, a synthetic corpus is generated: well-formed responses in the entry shapes the
+# normalizer handles, plus fenced, prose-wrapped, trailing-comma, null-valued and
+# truncated variants. The mix is an assumption, not a measured production rate.
+
+QUERIES = ["", "how much did I spend on food", "compare with last month", "show date wise transactions",
+           "download report", "top merchants this month"]
+ENTRY_SHAPES = [
+    lambda rng: {"header": f"Food ({rng.randint(1, 30)} entries)", "detail": f"₹{rng.randint(100, 9000)} at Food"},
+    lambda rng: {"header": f"2024-06-{rng.randint(1, 28):02d}", "detail": f"₹{rng.randint(10, 900)} at Merchant {rng.randint(1, 50)}"},
+    lambda rng: {"category": "Travel", "amount": f"₹{rng.randint(100, 9000)}"},
+    lambda rng: {"title": "Top merchants", "value": [f"Merchant {i}: ₹{rng.randint(100, 900)}" for i in range(3)]},
+    lambda rng: {"type": "tip", "content": "Set a monthly cap for dining out."},
+    lambda rng: {"text": "Spending is steady compared to last month."},
+    lambda rng: {"header": None, "detail": "null"},
+]
+
+def synthetic_response(rng):
+    resp = {}
+    if rng.random() < 0.7:
+        resp["insight_groups"] = [
+            {"header": f"Insight {i}", "detail": f"Food spending changed by {rng.randint(-60, 90)}% this month.",
+             "type": rng.choice(["trend", "alert", "tip"]), "category": rng.choice(["Food", "Travel", "Bills"]),
+             "transactions": []}
+            for i in range(rng.randint(3, 9))
+        ]
+    if not resp or rng.random() < 0.6:
+        resp["chat"] = {"header": rng.choice(["", "Your spending"]),
+                        "entries": [rng.choice(ENTRY_SHAPES)(rng) for _ in range(rng.randint(1, 8))]}
+    return json.dumps(resp, ensure_ascii=False, indent=rng.choice([None, 2]))
+
+def mutate(text, rng):
+    roll = rng.random()
+    if roll < 0.60:
+        return "clean", text
+    if roll < 0.70:
+        return "fenced", "```json\n" + text + "\n```"
+    if roll < 0.75:
+        return "prose", "Here is your analysis:\n" + text + "\nLet me know if you need anything else."
+    if roll < 0.80:
+        return "trailing_comma", text.replace("}", ",}", 1).replace("]", ",]", 1)
+    if roll < 0.97:
+        return "truncated", text[:rng.randint(len(text) // 3, len(text) - 1)]
+    return "not_json", "I'm sorry, I can't help with that."
+
+def synthetic_corpus(n=2000, seed=7):
+    rng = random.Random(seed)
+    return [mutate(synthetic_response(rng), rng) + (rng.choice(QUERIES),) for _ in range(n)]
+
+def recorded_corpus(path):
+    rng = random.Random(7)
+    with open(path, encoding="utf-8") as f:
+        return [("recorded", json.loads(line)["raw"], rng.choice(QUERIES)) for line in f if line.strip()]
+
+def legacy_process(raw, query):
+    # The previous handler: strip fences, json.loads, then three separate walks over the entries
+    resp = json.loads(strip_code_fences(raw))
+    if "chat" in resp and "entries" in resp["chat"]:
+        for entry in resp["chat"]["entries"]:
+            fix_null_entry(entry)
+        if not resp["chat"].get("header"):
+            resp["chat"]["header"] = query_header(query)
+        resp["chat"]["entries"] = [normalize_entry(entry) for entry in resp["chat"]["entries"]] or [
+            {"header": "", "detail": "Unable to get this data. Tip: Try a different keyword or see Reports."}]
+        app.add_smart_help_tip(resp["chat"], query)
+    return resp
+
+def new_process(raw, query):
+    return app.finalize_insight_response(parse_response(raw)[0], query)
+
+def run(fn, corpus):
+    ok = 0
+    outputs = []
+    start = time.perf_counter()
+    for _, raw, query in corpus:
+        try:
+            outputs.append(fn(raw, query))
+            ok += 1
+        except (ValueError, ResponseParseError):
+            outputs.append(None)
+    return ok, outputs, time.perf_counter() - start
+
+def main():
+    corpus = recorded_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus()
+    kinds = {}
+    for kind, _, _ in corpus:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    print(f"{len(corpus)} responses: " + ", ".join(f"{kind} {count}" for kind, count in sorted(kinds.items())))
+    results = {}
+    for label, fn in (("legacy", legacy_process), ("new", new_process)):
+        best = None
+        for _ in range(5):
+            ok, outputs, elapsed = run(fn, copy.deepcopy(corpus))
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = outputs
+        print(f"  {label:<7} parse failures {len(corpus) - ok:>5} ({(len(corpus) - ok) / len(corpus):.1%})  "
+              f"{best / len(corpus) * 1e6:7.1f} us/response")
+    same = sum(1 for old, new in zip(results["legacy"], results["new"])
+               if old is not None and old.get("chat") == new.get("chat"))
+    both = sum(1 for old in results["legacy"] if old is not None)
+    print(f"  chat output identical on {same}/{both} responses both pipelines parse")
+    by_kind = {}
+    for (kind, _, _), new in zip(corpus, results["new"]):
+        item = by_kind.setdefault(kind, [0, 0])
+        item[0] += new is not None
+        item[1] += 1
+    print("  new pipeline recovered: " + ", ".join(f"{kind} {good}/{total}" for kind, (good, total) in sorted(by_kind.items())))
+
+if __name__ == "__main__":
+    main()
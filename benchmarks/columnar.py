@@ -0,0 +1,120 @@
+from itertools import repeat
+from operator import itemgetter
+
+import numpy as np
+
+from aggregation import merchant_key
+
+# Kept for bench_columnar.py only: building the columns from a JSON list of dicts
+# costs more than the single dict pass, so the request handlers use aggregation.py
+MAX_EXACT_INT = 2 ** 53
+
+def intern(values):
+    # Codes follow first appearance, labels[code] is the original value
+    table = dict.fromkeys(values)
+    for code, value in enumerate(table):
+        table[value] = code
+    codes = np.fromiter(map(table.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, list(table)
+
+def group(codes, amounts, is_float):
+    # Vectorized group-by in first-appearance order; bincount adds weights in
+    # row order, so float sums match the sequential Python += exactly
+    if not len(codes):
+        return []
+    uniq, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    sums = np.bincount(inverse, weights=amounts, minlength=len(uniq))
+    counts = np.bincount(inverse, minlength=len(uniq))
+    floats = np.bincount(inverse, weights=is_float, minlength=len(uniq)) > 0
+    return [(int(uniq[i]), float(sums[i]) if floats[i] else int(sums[i]), int(counts[i]))
+            for i in np.argsort(first, kind="stable")]
+
+class ColumnarTransactions:
+    def __init__(self, rows, period_codes, period_labels, type_codes, amounts, is_float,
+                 category_codes, category_labels, merchant_codes, merchant_labels, method_codes, method_labels):
+        self.rows = rows
+        self.period_codes = period_codes
+        self.period_labels = period_labels
+        self.type_codes = type_codes
+        self.amounts = amounts
+        self.is_float = is_float
+        self.category_codes, self.category_labels = category_codes, category_labels
+        self.merchant_codes, self.merchant_labels = merchant_codes, merchant_labels
+        self.method_codes, self.method_labels = method_codes, method_labels
+
+    @classmethod
+    def from_records(cls, tx_list, periods=None):
+        # Returns None when amounts are not plain int/float, so callers fall back to the dict path.
+        # Columns are pulled with map(dict.get, ...) so extraction stays in C.
+        period_values = map(dict.get, tx_list, repeat("Period"))
+        if periods is not None:
+            wanted = {p: i for i, p in enumerate(dict.fromkeys(periods))}
+            codes = np.fromiter(map(wanted.get, period_values, repeat(-1)), dtype=np.int64, count=len(tx_list))
+            keep = np.flatnonzero(codes >= 0).tolist()
+            rows = list(itemgetter(*keep)(tx_list)) if len(keep) > 1 else [tx_list[i] for i in keep]
+            period_codes, period_labels = codes[keep], list(wanted)
+        else:
+            rows = tx_list
+            period_codes, period_labels = intern(list(period_values))
+        # One tuple per row keeps each dict's cache lines hot; zip(*) turns them into columns
+        if not rows:
+            return cls(rows, period_codes, period_labels, np.zeros(0, dtype=np.int8), np.zeros(0), np.zeros(0),
+                       np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64), [])
+        amount_values, type_values, category_values, merchant_values, method_values = zip(*[
+            (tx.get("Amount", 0), tx.get("Type"), tx.get("Category", "Unknown"), merchant_key(tx), tx.get("Method", "Unknown"))
+            for tx in rows
+        ])
+        kinds = set(map(type, amount_values))
+        if not kinds <= {int, float}:
+            return None
+        amounts = np.array(amount_values, dtype=np.float64)
+        if float in kinds:
+            is_float = np.fromiter(map(float.__instancecheck__, amount_values), dtype=bool, count=len(rows)).astype(np.float64)
+        else:
+            is_float = np.zeros(len(rows))
+        if int in kinds and np.abs(amounts[is_float == 0]).max(initial=0) >= MAX_EXACT_INT:
+            return None
+        # dict lookup matches Type == 0 / Type == 1 (0.0 and False hash like 0)
+        type_codes = np.fromiter(map({0: 0, 1: 1}.get, type_values, repeat(2)), dtype=np.int8, count=len(rows))
+        category_codes, category_labels = intern(category_values)
+        merchant_codes, merchant_labels = intern(merchant_values)
+        method_codes, method_labels = intern(method_values)
+        return cls(rows, period_codes, period_labels, type_codes, amounts, is_float,
+                   category_codes, category_labels, merchant_codes, merchant_labels, method_codes, method_labels)
+
+    def period_mask(self, period):
+        try:
+            code = self.period_labels.index(period)
+        except ValueError:
+            return np.zeros(len(self.rows), dtype=bool)
+        return self.period_codes == code
+
+    def take(self, mask):
+        index = np.flatnonzero(mask).tolist()
+        if len(index) > 1:
+            return list(itemgetter(*index)(self.rows))
+        return [self.rows[i] for i in index]
+
+    def summaries(self, period):
+        mask = self.period_mask(period)
+        amounts, is_float = self.amounts[mask], self.is_float[mask]
+        types = self.type_codes[mask]
+        out = {}
+        for key, type_code in (("expense_summary", 0), ("income_summary", 1)):
+            sel = types == type_code
+            out[key] = [{"category": self.category_labels[code], "amount": amount, "count": count}
+                        for code, amount, count in group(self.category_codes[mask][sel], amounts[sel], is_float[sel])]
+        out["merchant_summary"] = [{"merchant": self.merchant_labels[code], "amount": amount, "count": count}
+                                   for code, amount, count in group(self.merchant_codes[mask], amounts, is_float)]
+        out["payment_summary"] = [{"method": self.method_labels[code], "amount": amount}
+                                  for code, amount, _ in group(self.method_codes[mask], amounts, is_float)]
+        out["expense_total"] = sum(item["amount"] for item in out["expense_summary"])
+        out["income_total"] = sum(item["amount"] for item in out["income_summary"])
+        out["transactions"] = self.take(mask)
+        return out
+
+    def aggregate_periods(self, periods):
+        return {p: self.summaries(p) for p in periods}
+
+    def below(self, period, amount_limit):
+        return self.take(self.period_mask(period) & (self.amounts < amount_limit))
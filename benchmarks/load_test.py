@@ -0,0 +1,273 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import CATEGORIES, generate_users, month_periods
+
+# Drives /ai-insight under gunicorn against the mock OpenAI server (no API spend):
+#   python benchmarks/load_test.py --worker-class sync gthread gevent async --concurrency 1 16 64
+#   python benchmarks/load_test.py --output after.json --baseline before.json
+# Latency and RPS are measured by the client; per-stage wall and CPU time come from
+# the app's JSON request log (INSIGHT_LOG_JSON=1), which covers every gunicorn worker.
+
+# --worker-class async serves asgi.py on uvicorn workers instead of app:app
+WORKER_CLASSES = {"async": ("asgi:application", "uvicorn_worker.UvicornWorker")}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_ready(port, path, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"exited with code {proc.returncode} before listening on port {port}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+def get_json(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", path)
+    return json.loads(conn.getresponse().read())
+
+def start_mock(args):
+    port = free_port()
+    cmd = [sys.executable, os.path.join(ROOT, "benchmarks", "mock_openai.py"), "--port", str(port),
+           "--latency", str(args.latency), "--jitter", str(args.jitter)]
+    if args.mock_response:
+        cmd += ["--response-file", args.mock_response]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready(port, "/stats", proc)
+    return proc, port
+
+class Server:
+    # One gunicorn master; request log lines from all of its workers are collected in order
+    def __init__(self, worker_class, args, mock_port):
+        self.port = free_port()
+        env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+               "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1", "INSIGHT_LOG_JSON": "1",
+               "INSIGHT_JOB_WORKERS": "0", "PYTHONUNBUFFERED": "1"}
+        app_name, worker = WORKER_CLASSES.get(worker_class, (args.app, worker_class))
+        cmd = [sys.executable, "-m", "gunicorn", app_name, "--chdir", ROOT, "-b", f"127.0.0.1:{self.port}",
+               "-k", worker, "-w", str(args.workers), "--timeout", "300", "--log-level", "warning"]
+        if worker_class == "gthread":
+            cmd += ["--threads", str(args.threads)]
+        if worker_class == "gevent":
+            cmd += ["--worker-connections", str(args.worker_connections)]
+        self.proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+        self.records = []
+        threading.Thread(target=self.read_log, daemon=True).start()
+        try:
+            wait_ready(self.port, "/stats", self.proc)
+        except RuntimeError:
+            self.stop()
+            raise
+
+    def read_log(self):
+        for line in self.proc.stdout:
+            if line.startswith("{"):
+                try:
+                    self.records.append(json.loads(line))
+                except ValueError:
+                    pass
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(30)
+
+def request_bodies(args):
+    users = generate_users(args.users, args.rows, months=args.months, merchants=args.merchants,
+                           categories=args.categories)
+    periods = month_periods(args.months)[-args.periods:]
+    bodies = []
+    for user_id, tx_list in users.items():
+        for period in periods:
+            for query in args.query:
+                bodies.append(json.dumps({"period": period, "transactions": tx_list, "query": query,
+                                          "no_cache": not args.cache}).encode("utf-8"))
+    return bodies
+
+def drive(port, path, bodies, concurrency, duration):
+    # Closed loop: each client thread sends its next request as soon as the previous one returns
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+        i = index
+        while time.perf_counter() < stop_at:
+            body = bodies[i % len(bodies)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = "error"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def stage_summary(records):
+    # Mean wall and CPU milliseconds per request that ran the stage
+    totals = {}
+    for record in records:
+        for stage, seconds in record.get("stages", {}).items():
+            item = totals.setdefault(stage, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += seconds
+            item[2] += record.get("cpu", {}).get(stage, 0.0)
+    return {stage: {"requests": count, "wall_ms": round(wall / count * 1000, 3), "cpu_ms": round(cpu / count * 1000, 3)}
+            for stage, (count, wall, cpu) in sorted(totals.items())}
+
+def run_case(server, args, bodies, worker_class, concurrency, mock_port):
+    # warm each worker's imports, client pool and caches before measuring
+    drive(server.port, args.path, bodies, min(concurrency, args.workers * 2), args.warmup)
+    upstream = get_json(mock_port, "/stats")["requests"]
+    mark = len(server.records)
+    latencies, statuses, elapsed = drive(server.port, args.path, bodies, concurrency, args.duration)
+    time.sleep(0.5)
+    records = [r for r in server.records[mark:] if r.get("endpoint") == "ai_insight"]
+    ordered = sorted(latencies)
+    ok = statuses.get(200, 0)
+    return {
+        "worker_class": worker_class,
+        "workers": args.workers,
+        "threads": args.threads if worker_class == "gthread" else 1,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "rps": round(ok / elapsed, 2),
+        "latency_ms": {name: round(value * 1000, 2) for name, value in (
+            ("p50", percentile(ordered, 0.50)), ("p95", percentile(ordered, 0.95)), ("p99", percentile(ordered, 0.99)),
+            ("mean", sum(ordered) / len(ordered) if ordered else 0.0), ("max", ordered[-1] if ordered else 0.0))},
+        "upstream_calls": get_json(mock_port, "/stats")["requests"] - upstream,
+        "stages": stage_summary(records),
+    }
+
+def print_case(case):
+    latency = case["latency_ms"]
+    print(f"  {case['worker_class']:<8} c={case['concurrency']:<4} {case['rps']:>8.1f} rps  "
+          f"p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  p99 {latency['p99']:>8.1f} ms  "
+          f"statuses {case['statuses']}")
+    stages = "  ".join(f"{stage} {item['wall_ms']:.1f}/{item['cpu_ms']:.1f}" for stage, item in case["stages"].items())
+    if stages:
+        print(f"           stage wall/cpu ms: {stages}")
+
+def compare(results, baseline, tolerance):
+    # Returns the number of cases that regressed by more than tolerance (fraction)
+    previous = {(case["worker_class"], case["concurrency"]): case for case in baseline["runs"] if "error" not in case}
+    regressions = 0
+    print(f"== against baseline ({baseline['started']})")
+    for case in results["runs"]:
+        old = previous.get((case["worker_class"], case.get("concurrency")))
+        if old is None:
+            continue
+        rps = case["rps"] / old["rps"] - 1 if old["rps"] else 0.0
+        p95 = case["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1 if old["latency_ms"]["p95"] else 0.0
+        worse = rps < -tolerance or p95 > tolerance
+        regressions += worse
+        print(f"  {case['worker_class']:<8} c={case['concurrency']:<4} rps {rps:+7.1%}  p95 {p95:+7.1%}"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /ai-insight under gunicorn against the mock OpenAI server")
+    parser.add_argument("--app", default="app:app")
+    parser.add_argument("--path", default="/ai-insight")
+    parser.add_argument("--worker-class", nargs="+", default=["sync", "gthread", "gevent", "async"],
+                        help="gunicorn worker classes; async runs asgi:application on uvicorn workers")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--worker-connections", type=int, default=1000, help="greenlets per gevent worker")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per case")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=1.0, help="mock completion latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--mock-response", help="file the mock returns as the completion (default: canned insight)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=2000, help="average transactions per user")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--periods", type=int, default=3, help="most recent months to request insights for")
+    parser.add_argument("--merchants", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=len(CATEGORIES))
+    parser.add_argument("--query", action="append", help="query to send (repeatable); default is no query")
+    parser.add_argument("--cache", action="store_true", help="allow insight cache hits (off: every request reaches the LLM)")
+    parser.add_argument("--output", default="load_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed rps drop / p95 rise before flagging")
+    args = parser.parse_args()
+    args.query = args.query or [""]
+
+    bodies = request_bodies(args)
+    print(f"{len(bodies)} distinct requests, {args.users} users x ~{args.rows} rows, "
+          f"mock latency {args.latency}s +/- {args.jitter}s")
+    results = {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": {k: v for k, v in vars(args).items()
+               if k not in ("output", "baseline")}, "runs": []}
+    mock, mock_port = start_mock(args)
+    try:
+        for worker_class in args.worker_class:
+            try:
+                server = Server(worker_class, args, mock_port)
+            except RuntimeError as e:
+                # e.g. a worker class whose dependency is missing; the gunicorn log above has the cause
+                print(f"  {worker_class:<8} failed to start: {e}")
+                results["runs"].append({"worker_class": worker_class, "error": str(e)})
+                continue
+            try:
+                for concurrency in args.concurrency:
+                    case = run_case(server, args, bodies, worker_class, concurrency, mock_port)
+                    results["runs"].append(case)
+                    print_case(case)
+            finally:
+                server.stop()
+    finally:
+        mock.terminate()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
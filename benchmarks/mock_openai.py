@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for POST /v1/chat/completions, for exercising the app and the LLM gateway
+# without API spend. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+
+CANNED_RESPONSE = {
+    "insight_groups": [
+        {"header": "Spending up", "detail": "Food spending rose 32% over last month.", "type": "trend",
+         "category": "Food", "transactions": []},
+        {"header": "Recurring small spends", "detail": "12 payments under ₹200 at coffee shops.", "type": "habit",
+         "category": "Food", "transactions": []},
+    ],
+    "chat": {
+        "header": "Your month at a glance",
+        "entries": [
+            {"header": "Total spent", "detail": "You spent ₹48,210 this month."},
+            {"header": "Biggest change", "detail": "Travel is down ₹3,400 from last month."},
+        ],
+    },
+}
+
+class MockState:
+    def __init__(self, latency=0.0, jitter=0.0, fail_rate=0.0, fail_status=429, chunk_size=24, content=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.chunk_size = chunk_size
+        self.content = content or json.dumps(CANNED_RESPONSE, ensure_ascii=False)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "failures": 0, "streams": 0, "max_concurrent": 0}
+        self.active = 0
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        body = data.encode("utf-8")
+        self.wfile.write(f"{len(body):x}\r\n".encode("ascii") + body + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self.send_json(200, self.state.snapshot())
+        self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        state = self.state
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "not found"}})
+        state.count("requests")
+        with state.lock:
+            state.active += 1
+            state.counters["max_concurrent"] = max(state.counters["max_concurrent"], state.active)
+        try:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+            if random.random() < state.fail_rate:
+                state.count("failures")
+                return self.send_json(state.fail_status, {"error": {"message": "mock failure", "type": "mock"}},
+                                      headers=[("Retry-After", "0")] if state.fail_status == 429 else [])
+            if body.get("stream"):
+                return self.stream_completion(body)
+            self.send_json(200, self.completion(body))
+        finally:
+            with state.lock:
+                state.active -= 1
+
+    def usage(self, body):
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        prompt_tokens, completion_tokens = prompt_chars // 4, len(self.state.content) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def completion(self, body):
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.state.content}}],
+            "usage": self.usage(body),
+        }
+
+    def stream_completion(self, body):
+        state = self.state
+        state.count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o")}
+        pieces = [state.content[i:i + state.chunk_size] for i in range(0, len(state.content), state.chunk_size)]
+        # latency is the time to first token; producing the remaining chunks takes about as long again
+        per_chunk = state.latency / max(1, len(pieces))
+        for piece in pieces:
+            self.send_chunk("data: " + json.dumps({**base, "choices": [
+                {"index": 0, "delta": {"content": piece}, "finish_reason": None}]}, ensure_ascii=False) + "\n\n")
+            time.sleep(per_chunk)
+        self.send_chunk("data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}) + "\n\n")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.send_chunk("data: " + json.dumps({**base, "choices": [], "usage": self.usage(body)}) + "\n\n")
+        self.send_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # clients that hit their deadline drop the connection mid-response
+        pass
+
+def serve(port=0, **options):
+    # Starts the mock in a daemon thread; returns (server, state, base_url)
+    state = MockState(**options)
+    handler = type("MockHandler", (Handler,), {"state": state})
+    server = MockServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MOCK_OPENAI_PORT", 8001)))
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--fail-status", type=int, default=429)
+    parser.add_argument("--chunk-size", type=int, default=24, help="characters per streamed chunk")
+    parser.add_argument("--response-file", help="file whose contents are returned as the completion")
+    args = parser.parse_args()
+    content = None
+    if args.response_file:
+        with open(args.response_file, encoding="utf-8") as f:
+            content = f.read()
+    server, _, base_url = serve(args.port, latency=args.latency, jitter=args.jitter, fail_rate=args.fail_rate,
+                                fail_status=args.fail_status, chunk_size=args.chunk_size, content=content)
+    print(f"mock OpenAI listening on {base_url} (stats at /stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
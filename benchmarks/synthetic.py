@@ -0,0 +1,52 @@
+import random
+
+CATEGORIES = ["Food", "Groceries", "Fuel", "Rent", "Utility", "Shopping", "Travel", "Health",
+              "Entertainment", "Education", "Subscription", "Personal", "Gifts", "EMI", "Others"]
+INCOME_CATEGORIES = ["Salary", "Interest", "Refund", "Freelance"]
+METHODS = ["UPI", "Cash", "Card", "NetBanking", "Wallet"]
+
+def month_periods(months, end="202406"):
+    year, month = int(end[:4]), int(end[4:6])
+    periods = []
+    for _ in range(months):
+        periods.append(f"{year}{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return periods[::-1]
+
+def generate_transactions(n, months=36, merchants=500, seed=42, end="202406", categories=len(CATEGORIES)):
+    rng = random.Random(seed)
+    periods = month_periods(months, end)
+    merchant_names = [f"Merchant {i}" for i in range(merchants)]
+    category_names = CATEGORIES[:categories]
+    tx_list = []
+    for _ in range(n):
+        period = rng.choice(periods)
+        day = rng.randint(1, 28)
+        if rng.random() < 0.08:
+            tx_list.append({
+                "Period": period,
+                "Date": f"{period[:4]}-{period[4:]}-{day:02d}",
+                "Type": 1,
+                "Category": rng.choice(INCOME_CATEGORIES),
+                "Amount": round(rng.uniform(1000, 90000), 2),
+                "Method": rng.choice(["NetBanking", "UPI"]),
+            })
+        else:
+            tx_list.append({
+                "Period": period,
+                "Date": f"{period[:4]}-{period[4:]}-{day:02d}",
+                "Type": 0,
+                "Category": rng.choice(category_names),
+                "Merchant": rng.choice(merchant_names),
+                "Amount": rng.choice([rng.randint(10, 500), round(rng.uniform(10, 8000), 2)]),
+                "Method": rng.choice(METHODS),
+            })
+    return tx_list
+
+def generate_users(users, rows, seed=42, **options):
+    # {user_id: history}; each user gets its own seed and a history size of rows/2..rows*3/2
+    rng = random.Random(seed)
+    return {f"user-{i}": generate_transactions(rng.randint(max(1, rows // 2), rows * 3 // 2), seed=seed + i, **options)
+            for i in range(users)}
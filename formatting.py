@@ -0,0 +1,18 @@
+# Amount and change formatting shared by local answers, the prompt blocks and the fact table
+
+def rupees(amount):
+    # User-facing amounts in chat answers: ₹1,234.50
+    return f"-₹{-amount:,.2f}" if amount < 0 else f"₹{amount:,.2f}"
+
+def compact_rupees(amount):
+    # Prompt encoding: no grouping and no ".00", so ₹1234 and ₹1234.50
+    text = f"{abs(amount):.2f}"
+    if text.endswith(".00"):
+        text = text[:-3]
+    return f"-₹{text}" if amount < 0 else f"₹{text}"
+
+def pct_change(now, before):
+    # Percentage change, or None when there is nothing to compare against
+    if not before:
+        return None
+    return (now - before) / before * 100
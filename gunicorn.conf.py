@@ -0,0 +1,18 @@
+import os
+
+# Procfile / render.yaml run plain "gunicorn", so the app is chosen here.
+# SERVE_MODE=async serves asgi.py on uvicorn workers: /ai-insight awaits the
+# completion on an event loop, so one process holds hundreds of in-flight requests.
+SERVE_MODE = os.environ.get("SERVE_MODE", "sync")
+
+# Streaming insights hold a connection for the whole completion; use
+# WEB_WORKER_CLASS=gevent (SERVE_MODE=sync) to serve many streams per worker.
+# Each stream also holds a gateway slot, so raise LLM_MAX_IN_FLIGHT to match.
+worker_class = os.environ.get("WEB_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("WEB_WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+wsgi_app = "app:app"
+
+if SERVE_MODE == "async":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
@@ -0,0 +1,141 @@
+import codecs
+import json
+import os
+import re
+
+from aggregation import PeriodAggregator
+
+INGEST_STREAM_MIN_BYTES = int(os.environ.get("INGEST_STREAM_MIN_BYTES", 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+MAX_VALUE_BYTES = 16 * 1024 * 1024
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+class IngestError(ValueError):
+    pass
+
+class BodyReader:
+    # Incremental reader over a JSON object body; only the unparsed tail is buffered
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        if self.eof:
+            return False
+        chunk = self.stream.read(size or self.chunk_size)
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk or b"", final=not chunk)
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise IngestError("Unexpected end of JSON body")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise IngestError(f"Expected '{char}' at body offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # an incomplete value is retried once the unparsed tail has doubled,
+                # so a large value is decoded O(log n) times rather than once per chunk
+                tail = len(self.buf) - self.pos
+                if tail > MAX_VALUE_BYTES or not self.fill(max(self.chunk_size, tail)):
+                    raise IngestError(str(e))
+                continue
+            # a number touching the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+def iter_body(stream, array_keys=("transactions",), chunk_size=CHUNK_SIZE):
+    # Yields ("field", key, value) for top-level fields, ("array", key, None) when
+    # one of array_keys opens and ("item", key, element) for each of its elements,
+    # without materializing the array
+    reader = BodyReader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise IngestError("Object keys must be strings")
+        reader.expect(":")
+        if key in array_keys and reader.peek() == "[":
+            reader.pos += 1
+            yield "array", key, None
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield "item", key, reader.value()
+                    if reader.peek() == ",":
+                        reader.pos += 1
+                        continue
+                    reader.expect("]")
+                    break
+        else:
+            yield "field", key, reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
+
+def read_insight_request(stream, periods_for, period_hint=None, period_key="period", list_keys=()):
+    # Feeds transactions straight into a PeriodAggregator for periods_for(body[period_key]).
+    # Memory stays bounded by those periods when period_key precedes "transactions"
+    # in the body (or comes as period_hint); otherwise rows are held until it arrives.
+    # Arrays named in list_keys are collected into data one element at a time.
+    data = {}
+    aggregator = PeriodAggregator(periods_for(period_hint)) if period_hint else None
+    pending = []
+    has_transactions = False
+    for kind, key, value in iter_body(stream, ("transactions", *list_keys)):
+        if kind == "array":
+            if key == "transactions":
+                has_transactions = True
+            else:
+                data[key] = []
+            continue
+        if kind == "item" and key != "transactions":
+            data[key].append(value)
+            continue
+        if kind == "item":
+            if not isinstance(value, dict):
+                continue
+            if aggregator is not None:
+                aggregator.add(value)
+            else:
+                pending.append(value)
+            continue
+        data[key] = value
+        if key == period_key and period_hint and value != period_hint:
+            raise IngestError("period in the query string and body differ")
+        if key == period_key and aggregator is None and value:
+            aggregator = PeriodAggregator(periods_for(value))
+            aggregator.add_all(pending)
+            pending = []
+    if period_hint and not data.get(period_key):
+        data[period_key] = period_hint
+    if not has_transactions or aggregator is None:
+        return data, None
+    return data, aggregator.result()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+def canonical_digest(payload):
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+class DiskStore:
+    # sqlite file shared by all gunicorn workers on the same host
+    def __init__(self, path):
+        self.path = path
+        with closing(self.connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS insight_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, now):
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT value, expires FROM insight_cache WHERE key = ?", (key,)).fetchone()
+        if row and row[1] > now:
+            return row[0], row[1]
+        return None
+
+    def set(self, key, value, expires):
+        with closing(self.connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO insight_cache (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+
+    def prune(self, now):
+        with closing(self.connect()) as conn, conn:
+            return conn.execute("DELETE FROM insight_cache WHERE expires <= ?", (now,)).rowcount
+
+class InsightCache:
+    # In-process LRU with TTL and a byte budget, optionally backed by a DiskStore
+    def __init__(self, ttl=3600, max_entries=512, max_bytes=32 * 1024 * 1024, disk_path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.disk = DiskStore(disk_path) if disk_path else None
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "evictions": 0, "expirations": 0, "sets": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None:
+                value, expires, _ = item
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return value
+                self.drop(key)
+                self.counters["expirations"] += 1
+        if self.disk:
+            found = self.disk.get(key, now)
+            if found:
+                with self.lock:
+                    self.counters["disk_hits"] += 1
+                    self.store(key, found[0], found[1])
+                return found[0]
+        with self.lock:
+            self.counters["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        expires = time.time() + self.ttl
+        with self.lock:
+            self.counters["sets"] += 1
+            self.store(key, value, expires)
+            prune = self.disk is not None and self.counters["sets"] % 100 == 0
+        if self.disk:
+            self.disk.set(key, value, expires)
+            if prune:
+                self.disk.prune(time.time())
+
+    def bypass(self):
+        with self.lock:
+            self.counters["bypasses"] += 1
+
+    def store(self, key, value, expires):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.drop(key)
+        self.entries[key] = (value, expires, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self.drop(oldest)
+            self.counters["evictions"] += 1
+
+    def drop(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hit_rate": round((self.counters["hits"] + self.counters["disk_hits"]) / lookups, 4) if lookups else 0.0,
+                "disk": bool(self.disk),
+            }
+
+def cache_from_env():
+    return InsightCache(
+        ttl=int(os.environ.get("INSIGHT_CACHE_TTL", 3600)),
+        max_entries=int(os.environ.get("INSIGHT_CACHE_MAX_ENTRIES", 512)),
+        max_bytes=int(os.environ.get("INSIGHT_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+        disk_path=os.environ.get("INSIGHT_CACHE_PATH") or None,
+    )
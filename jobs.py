@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from insight_cache import canonical_digest
+
+JOB_WORKERS = int(os.environ.get("INSIGHT_JOB_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get("INSIGHT_JOB_MAX_ATTEMPTS", 3))
+# A job left "running" this long is assumed lost with its worker process and is picked up again
+JOB_STALE_SECONDS = float(os.environ.get("INSIGHT_JOB_STALE_SECONDS", 300))
+JOB_RETENTION_SECONDS = float(os.environ.get("INSIGHT_JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+JOB_POLL_SECONDS = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insight_jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS insight_jobs_status ON insight_jobs (status, created);
+CREATE INDEX IF NOT EXISTS insight_jobs_user ON insight_jobs (user_id, period, created);
+"""
+COLUMNS = ("id", "user_id", "period", "digest", "status", "result", "error", "attempts", "created", "updated")
+
+def job_id(user_id, period, digest):
+    # Deterministic, so the same (user, period, data digest) always maps to one job
+    return canonical_digest({"user_id": user_id, "period": period, "digest": digest})[:32]
+
+def job_record(row):
+    job = dict(zip(COLUMNS, row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+class JobQueue:
+    # sqlite-backed queue drained by an in-process thread pool. Every gunicorn worker
+    # runs its own pool against the same file; claims are serialized by BEGIN IMMEDIATE.
+    def __init__(self, path, handler, workers=JOB_WORKERS):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        with closing(self.connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def start(self):
+        with self.lock:
+            if self.threads or self.workers <= 0:
+                return
+            self.prune(time.time() - JOB_RETENTION_SECONDS)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.run, name=f"insight-job-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def enqueue(self, user_id, period, digest):
+        # Returns (job id, status). A job for the same data is reused; failed ones are retried.
+        jid = job_id(user_id, period, digest)
+        now = time.time()
+        with closing(self.connect()) as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO insight_jobs (id, user_id, period, digest, status, created, updated) "
+                         "VALUES (?, ?, ?, ?, 'pending', ?, ?)", (jid, user_id, period, digest, now, now))
+            conn.execute("UPDATE insight_jobs SET status = 'pending', attempts = 0, error = NULL, created = ?, updated = ? "
+                         "WHERE id = ? AND status = 'error'", (now, now, jid))
+            status = conn.execute("SELECT status FROM insight_jobs WHERE id = ?", (jid,)).fetchone()[0]
+        if status == "pending":
+            self.start()
+            self.wakeup.set()
+        return jid, status
+
+    def get(self, jid):
+        with closing(self.connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM insight_jobs WHERE id = ?", (jid,)).fetchone()
+        return job_record(row) if row else None
+
+    def latest(self, user_id, period):
+        with closing(self.connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM insight_jobs WHERE user_id = ? AND period = ? "
+                               "ORDER BY created DESC LIMIT 1", (user_id, period)).fetchone()
+        return job_record(row) if row else None
+
+    def claim(self):
+        now = time.time()
+        stale = now - JOB_STALE_SECONDS
+        with closing(self.connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE insight_jobs SET status = 'error', error = 'worker lost', updated = ? "
+                         "WHERE status = 'running' AND updated < ? AND attempts >= ?", (now, stale, JOB_MAX_ATTEMPTS))
+            row = conn.execute("SELECT id, user_id, period, digest, attempts FROM insight_jobs "
+                               "WHERE status = 'pending' OR (status = 'running' AND updated < ?) "
+                               "ORDER BY created LIMIT 1", (stale,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE insight_jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                         (now, row[0]))
+        return {"id": row[0], "user_id": row[1], "period": row[2], "digest": row[3], "attempts": row[4] + 1}
+
+    def finish(self, job, result=None, error=None):
+        if error is None:
+            status = "done"
+        else:
+            status = "pending" if job["attempts"] < JOB_MAX_ATTEMPTS else "error"
+        with closing(self.connect()) as conn, conn:
+            conn.execute("UPDATE insight_jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                         (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                          error, time.time(), job["id"]))
+
+    def run(self):
+        while True:
+            try:
+                self.step()
+            except sqlite3.OperationalError:
+                # database still locked after the connect timeout; retry on the next poll
+                time.sleep(JOB_POLL_SECONDS)
+
+    def step(self):
+        job = self.claim()
+        if job is None:
+            self.wakeup.wait(JOB_POLL_SECONDS)
+            self.wakeup.clear()
+            return
+        try:
+            result = self.handler(job)
+        except Exception as e:
+            self.finish(job, error=str(e) or e.__class__.__name__)
+            return
+        self.finish(job, result=result)
+
+    def prune(self, before):
+        with closing(self.connect()) as conn, conn:
+            return conn.execute("DELETE FROM insight_jobs WHERE status IN ('done', 'error') AND updated < ?",
+                                (before,)).rowcount
+
+    def stats(self):
+        with closing(self.connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM insight_jobs GROUP BY status").fetchall())
+        return {"workers": len(self.threads), **{status: counts.get(status, 0) for status in ("pending", "running", "done", "error")}}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue(handler):
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(os.environ.get("INSIGHT_JOBS_PATH", "insight_jobs.db"), handler)
+    return _queue
+
+def job_stats():
+    return _queue.stats() if _queue is not None else {}
@@ -0,0 +1,296 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from openai import (DEFAULT_CONNECTION_LIMITS, APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI,
+                    DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, Timeout)
+
+import metrics
+from insight_cache import canonical_digest
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 30))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 90))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 16))
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", 32))
+# One async process stands in for many sync workers, so its cap and pool are larger
+ASYNC_LLM_MAX_IN_FLIGHT = int(os.environ.get("ASYNC_LLM_MAX_IN_FLIGHT", 256))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = (408, 409, 429)
+
+class LLMError(Exception):
+    status = 502
+
+class LLMBusy(LLMError):
+    status = 503
+
+class LLMTimeout(LLMError):
+    status = 504
+
+class LLMUpstreamError(LLMError):
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+def build_client():
+    # Retries are done by LLMGateway, so the SDK's own retry loop is off.
+    # OPENAI_BASE_URL is read by the SDK (e.g. benchmarks/mock_openai.py).
+    limits = type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE, keepalive_expiry=60)
+    return OpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        max_retries=0,
+        timeout=Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        http_client=DefaultHttpxClient(limits=limits),
+    )
+
+def build_async_client():
+    limits = type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=ASYNC_LLM_MAX_IN_FLIGHT, max_keepalive_connections=ASYNC_LLM_MAX_IN_FLIGHT, keepalive_expiry=60)
+    return AsyncOpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        max_retries=0,
+        timeout=Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        http_client=DefaultAsyncHttpxClient(limits=limits),
+    )
+
+def is_retryable(e):
+    if isinstance(e, APIStatusError):
+        return e.status_code in RETRY_STATUSES or e.status_code >= 500
+    return isinstance(e, APIConnectionError)
+
+def retry_after(e):
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def translate(e):
+    if isinstance(e, APITimeoutError):
+        return LLMTimeout("LLM request timed out")
+    if isinstance(e, APIStatusError) and e.status_code == 429:
+        return LLMUpstreamError("LLM rate limit reached, try again shortly", 429)
+    return LLMUpstreamError(str(e))
+
+def backoff_delay(e, attempt):
+    # The server's Retry-After when given, else full-jitter exponential backoff
+    delay = retry_after(e)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)) if delay is None else delay
+
+class CallPolicy:
+    # Deadline, retry decisions and counters shared by LLMGateway and AsyncLLMGateway;
+    # each gateway owns one and only supplies its own waits (threads or the event loop)
+    def __init__(self, max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {"calls": 0, "ok": 0, "retries": 0, "errors": 0, "busy": 0, "timeouts": 0, "coalesced": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+        metrics.inc("llm_requests_total", outcome=name)
+
+    def deadline_at(self, deadline=None):
+        return time.monotonic() + (deadline or self.deadline)
+
+    def remaining(self, deadline_at):
+        return max(0, deadline_at - time.monotonic())
+
+    def busy(self):
+        self.count("busy")
+        return LLMBusy("Too many insight requests in progress, try again shortly")
+
+    def timed_out(self):
+        self.count("timeouts")
+        return LLMTimeout("LLM deadline exceeded")
+
+    def entered(self, delta):
+        with self.lock:
+            self.in_flight += delta
+
+    def attempt_timeout(self, deadline_at):
+        # Timeout for the next attempt, capped by the overall deadline
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise self.timed_out()
+        with self.lock:
+            self.counters["calls"] += 1
+        return min(self.timeout, remaining)
+
+    def retry_delay(self, e, attempt, deadline_at):
+        # How long to wait before retrying a failed attempt; raises the translated
+        # error when it is not retryable, out of retries or the wait would pass the deadline
+        delay = backoff_delay(e, attempt)
+        if not is_retryable(e) or attempt >= self.max_retries or time.monotonic() + delay >= deadline_at:
+            self.count("timeouts" if isinstance(e, APITimeoutError) else "errors")
+            raise translate(e) from e
+        self.count("retries")
+        return delay
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "in_flight": self.in_flight}
+
+class Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+
+class LLMGateway:
+    def __init__(self, client, max_in_flight=LLM_MAX_IN_FLIGHT, **options):
+        self.client = client
+        self.policy = CallPolicy(**options)
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def acquire(self, deadline_at):
+        if not self.slots.acquire(timeout=self.policy.remaining(deadline_at)):
+            raise self.policy.busy()
+        self.policy.entered(1)
+
+    def release(self):
+        self.policy.entered(-1)
+        self.slots.release()
+
+    def create(self, messages, deadline_at, params):
+        attempt = 0
+        while True:
+            timeout = self.policy.attempt_timeout(deadline_at)
+            try:
+                result = self.client.chat.completions.create(messages=messages, timeout=timeout, **params)
+            except (APIStatusError, APIConnectionError) as e:
+                time.sleep(self.policy.retry_delay(e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self.policy.count("ok")
+            return result
+
+    def complete(self, messages, deadline=None, **params):
+        # Identical concurrent requests share one completion: the first caller makes
+        # the call and later callers wait for its result (or its error)
+        deadline_at = self.policy.deadline_at(deadline)
+        key = canonical_digest({"messages": messages, **params})
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight(threading.Event())
+        if not leader:
+            self.policy.count("coalesced")
+            if not flight.done.wait(self.policy.remaining(deadline_at)):
+                raise self.policy.timed_out()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            self.acquire(deadline_at)
+            try:
+                flight.result = self.create(messages, deadline_at, params)
+            finally:
+                self.release()
+            metrics.record_usage(getattr(flight.result, "usage", None))
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def stream(self, messages, deadline=None, **params):
+        # Streams are per-client and not coalesced; retries only happen before the
+        # first chunk, and the slot is held until the stream is drained or closed
+        deadline_at = self.policy.deadline_at(deadline)
+        self.acquire(deadline_at)
+        try:
+            for chunk in self.create(messages, deadline_at, {**params, "stream": True}):
+                if getattr(chunk, "usage", None):
+                    metrics.record_usage(chunk.usage)
+                yield chunk
+        finally:
+            self.release()
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.flights)
+        return {**self.policy.stats(), "pending_flights": pending}
+
+class AsyncLLMGateway:
+    # Completions for an AsyncOpenAI client on one event loop (asgi.py): the same
+    # CallPolicy as LLMGateway, with waits that yield to the loop instead of blocking
+    # a thread. The flight table is only touched on the loop, so it needs no lock.
+    def __init__(self, client, max_in_flight=ASYNC_LLM_MAX_IN_FLIGHT, **options):
+        self.client = client
+        self.policy = CallPolicy(**options)
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.flights = {}
+
+    async def acquire(self, deadline_at):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.policy.remaining(deadline_at))
+        except asyncio.TimeoutError:
+            raise self.policy.busy() from None
+        self.policy.entered(1)
+
+    def release(self):
+        self.policy.entered(-1)
+        self.slots.release()
+
+    async def create(self, messages, deadline_at, params):
+        attempt = 0
+        while True:
+            timeout = self.policy.attempt_timeout(deadline_at)
+            try:
+                result = await self.client.chat.completions.create(messages=messages, timeout=timeout, **params)
+            except (APIStatusError, APIConnectionError) as e:
+                await asyncio.sleep(self.policy.retry_delay(e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self.policy.count("ok")
+            return result
+
+    async def complete(self, messages, deadline=None, **params):
+        deadline_at = self.policy.deadline_at(deadline)
+        key = canonical_digest({"messages": messages, **params})
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.policy.count("coalesced")
+            try:
+                await asyncio.wait_for(flight.done.wait(), self.policy.remaining(deadline_at))
+            except asyncio.TimeoutError:
+                raise self.policy.timed_out() from None
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        flight = self.flights[key] = Flight(asyncio.Event())
+        try:
+            await self.acquire(deadline_at)
+            try:
+                flight.result = await self.create(messages, deadline_at, params)
+            finally:
+                self.release()
+            metrics.record_usage(getattr(flight.result, "usage", None))
+            return flight.result
+        except BaseException as e:
+            # a cancelled leader (client went away) fails its followers rather than hanging them
+            flight.error = e if isinstance(e, Exception) else LLMError("LLM request cancelled")
+            raise
+        finally:
+            del self.flights[key]
+            flight.done.set()
+
+    def stats(self):
+        return {**self.policy.stats(), "pending_flights": len(self.flights)}
@@ -0,0 +1,291 @@
+import re
+import threading
+
+from aggregation import merchant_key
+from formatting import pct_change, rupees
+
+BELOW_RE = re.compile(r"(below|under|less than|upto|micro\-spend|microspend|small)\s*₹?\s*([0-9]+)")
+TOP_RE = re.compile(r"\b(?:top|biggest|largest|highest|most)\s*(\d+)?\s*(merchants?|payees?|shops?|stores?|categor(?:y|ies)|payment methods?|methods?|payments?|transactions?|expenses?)")
+RANGE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})\s*(?:to|and|till|until|through|-)\s*(\d{4}-\d{2}-\d{2})")
+AMOUNT_WORDS = ("how much", "total", "spent", "spend", "spending", "cost", "paid", "amount", "expense")
+COUNT_WORDS = ("how many", "count", "number of", "times", "orders")
+COMPARE_WORDS = ("compare", "comparison", " vs", "versus", "than last month", "month over month", "change from last month", "difference")
+PREV_WORDS = ("last month", "previous month", "prev month")
+# Advice, forecasts and other open-ended questions always go to the LLM
+OPEN_ENDED_WORDS = ("why", "suggest", "tip", "advice", "should", "predict", "forecast", "how can", "how do", "save", "reduce", "budget", "insight", "analy", "plan", "trend", "pattern")
+# Every other word of a query must be one of these or part of a known category/merchant/method
+# name. Anything else (an unknown payee, "this year", "in march", "on weekends", "above 1000")
+# changes the question in a way the rules can't answer, so it goes to the LLM.
+QUERY_WORDS = frozenset("""
+    a an the i me my we our you your it its this that these those s m
+    is are was were be been am do did does have has had get got
+    in on at for of to by via with from into and or vs versus
+    what which how much many total totals overall all so far till now
+    spend spends spent spending cost costs paid pay paying payment payments amount amounts
+    expense expenses expenditure income earned earnings received
+    count number times orders order transaction transactions entries entry
+    current month monthly last previous prev
+    compare compared comparison than change changed difference between over
+    show tell give list please
+""".split())
+WORD_RE = re.compile(r"\w+")
+
+stats = {"queries": 0, "local": 0, "llm": 0, "intents": {}}
+stats_lock = threading.Lock()
+
+def record(intent):
+    with stats_lock:
+        stats["queries"] += 1
+        if intent:
+            stats["local"] += 1
+            stats["intents"][intent] = stats["intents"].get(intent, 0) + 1
+        else:
+            stats["llm"] += 1
+
+def snapshot():
+    with stats_lock:
+        return {**stats, "intents": dict(stats["intents"]),
+                "hit_rate": round(stats["local"] / stats["queries"], 4) if stats["queries"] else 0.0}
+
+def entries_label(count):
+    return f"{count} entries" if count != 1 else "1 entry"
+
+def change_label(now, before):
+    pct = pct_change(now, before)
+    if pct is None:
+        return "new this period" if now else "no change"
+    return f"{pct:+.0f}%"
+
+def tx_entry(tx):
+    return {
+        "header": tx.get("Merchant") or tx.get("Transaction") or tx.get("Category") or tx.get("Method") or "",
+        "detail": f"{rupees(tx.get('Amount', 0))} on {tx.get('Date') or 'Period ' + str(tx.get('Period', ''))}"
+    }
+
+def has_any(q, words):
+    return any(word in q for word in words)
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+def word_at(q, word):
+    # First offset where word occurs in q with no letter/digit directly before or after
+    # it, like (?<!\w)word(?!\w) but without compiling a pattern per merchant name; -1 if none
+    start = q.find(word)
+    while start != -1:
+        end = start + len(word)
+        if (start == 0 or not is_word_char(q[start - 1])) and (end == len(q) or not is_word_char(q[end])):
+            return start
+        start = q.find(word, start + 1)
+    return -1
+
+def below_answer(ctx, q):
+    m_below = BELOW_RE.search(q)
+    if not m_below:
+        return None
+    period = ctx["period"]
+    amount_limit = int(m_below.group(2)) if m_below.group(2).isdigit() else 500
+    matches = [tx for tx in ctx["current"]["transactions"] if tx.get("Amount", 0) < amount_limit]
+    entry_list = [tx_entry(tx) for tx in matches]
+    return {
+        "header": f"Transactions Below ₹{amount_limit}",
+        "entries": entry_list if entry_list else [{"header": "", "detail": f"No transactions below ₹{amount_limit} for {period}."}]
+    }
+
+def expense_table(summary, field):
+    # Merchant or method totals over expenses only: merchant_summary and payment_summary
+    # also count income, e.g. the salary payer and the bank account it lands in
+    rows = {}
+    for tx in summary["transactions"]:
+        if tx.get("Type") != 0:
+            continue
+        name = merchant_key(tx) if field == "merchant" else tx.get("Method", "Unknown")
+        row = rows.get(name)
+        if row is None:
+            row = rows[name] = {field: name, "amount": 0, "count": 0}
+        row["amount"] += tx.get("Amount", 0)
+        row["count"] += 1
+    return list(rows.values())
+
+def lookup_tables(summary):
+    return (
+        ("category", summary["expense_summary"] + summary["income_summary"]),
+        ("merchant", expense_table(summary, "merchant")),
+        ("method", expense_table(summary, "method")),
+    )
+
+def blank(q, start, end):
+    # Same-length blanking keeps the other match offsets in q valid
+    return q[:start] + " " * (end - start) + q[end:]
+
+def find_keys(tables, q):
+    # Category/merchant/method names (from either period) that occur as whole words in
+    # the lower-cased query, longest first so "swiggy instamart" is not also Swiggy and
+    # "current" is not Rent. Returns the keys in query order and the query with their
+    # words blanked.
+    names = {}
+    for period_tables in tables:
+        for field, rows in period_tables:
+            for row in rows:
+                name = row[field]
+                n = str(name).lower().strip() if name else ""
+                if len(n) >= 3 and n not in names:
+                    names[n] = (field, name, n)
+    found = []
+    for n in sorted(names, key=len, reverse=True):
+        start = word_at(q, n)
+        while start != -1:
+            found.append((start, names[n]))
+            q = blank(q, start, start + len(n))
+            start = word_at(q, n)
+    keys = []
+    for _, key in sorted(found, key=lambda item: item[0]):
+        if key not in keys:
+            keys.append(key)
+    return keys, q
+
+def unresolved(q):
+    return any(word not in QUERY_WORDS for word in WORD_RE.findall(q))
+
+def key_totals(tables, field, name):
+    amount, count = 0, 0
+    for table_field, rows in tables:
+        if table_field != field:
+            continue
+        for row in rows:
+            if row[field] == name:
+                amount += row["amount"]
+                count += row.get("count", 0)
+    return amount, count
+
+def top_answer(summary, tables, m_top, label):
+    n = int(m_top.group(1)) if m_top.group(1) else 3
+    kind = m_top.group(2)
+    if kind.startswith(("merchant", "payee", "shop", "store")):
+        field, title = "merchant", "Merchants"
+    elif kind.startswith("categor"):
+        field, title = "category", "Categories"
+    elif kind.startswith(("payment", "method")):
+        field, title = "method", "Payment Methods"
+    else:
+        txs = sorted((tx for tx in summary["transactions"] if tx.get("Type") == 0), key=lambda tx: tx.get("Amount", 0), reverse=True)[:n]
+        return {
+            "header": f"Top {n} Transactions ({label})",
+            "entries": [tx_entry(tx) for tx in txs] or [{"header": "", "detail": f"No transactions for {label}."}]
+        }
+    rows = summary["expense_summary"] if field == "category" else dict(tables)[field]
+    rows = sorted(rows, key=lambda row: row["amount"], reverse=True)[:n]
+    return {
+        "header": f"Top {n} {title} ({label})",
+        "entries": [{"header": str(row[field]), "detail": f"{rupees(row['amount'])} ({entries_label(row['count'])})"} for row in rows]
+                   or [{"header": "", "detail": f"No data for {label}."}]
+    }
+
+def range_answer(ctx, q):
+    m_range = RANGE_RE.search(q)
+    if not m_range:
+        return None
+    start, end = sorted(m_range.groups())
+    months = {ctx["period"], ctx["prev_period"]}
+    if start[:4] + start[5:7] not in months or end[:4] + end[5:7] not in months:
+        return None
+    txs = [tx for summary in (ctx["previous"], ctx["current"]) for tx in summary["transactions"]
+           if tx.get("Type") == 0 and start <= str(tx.get("Date") or "")[:10] <= end]
+    total = sum(tx.get("Amount", 0) for tx in txs)
+    entries = [{"header": "Total", "detail": f"{rupees(total)} ({entries_label(len(txs))})"}]
+    entries += [tx_entry(tx) for tx in sorted(txs, key=lambda tx: str(tx.get("Date")))]
+    return {"header": f"Spend {start} to {end}", "entries": entries}
+
+def keys_answer(ctx, tables, keys):
+    # Two names side by side in the current period ("upi vs cash")
+    (field_a, name_a, _), (field_b, name_b, _) = keys
+    now_a, count_a = key_totals(tables, field_a, name_a)
+    now_b, count_b = key_totals(tables, field_b, name_b)
+    return {"header": f"{name_a} vs {name_b}", "entries": [
+        {"header": f"{name_a} ({ctx['period']})", "detail": f"{rupees(now_a)} ({entries_label(count_a)})"},
+        {"header": f"{name_b} ({ctx['period']})", "detail": f"{rupees(now_b)} ({entries_label(count_b)})"},
+        {"header": "Difference", "detail": rupees(now_a - now_b)},
+    ]}
+
+def compare_answer(ctx, tables, key):
+    current, previous = ctx["current"], ctx["previous"]
+    if key:
+        field, name, _ = key
+        now, now_count = key_totals(tables[0], field, name)
+        before, before_count = key_totals(tables[1], field, name)
+        header = str(name)
+    elif "income" in ctx["query"].lower():
+        now, now_count = current["income_total"], sum(row["count"] for row in current["income_summary"])
+        before, before_count = previous["income_total"], sum(row["count"] for row in previous["income_summary"])
+        header = "Income"
+    else:
+        now, now_count = current["expense_total"], sum(row["count"] for row in current["expense_summary"])
+        before, before_count = previous["expense_total"], sum(row["count"] for row in previous["expense_summary"])
+        header = "Expense"
+    return {"entries": [
+        {"header": f"{header} ({ctx['period']})", "detail": f"{rupees(now)} ({entries_label(now_count)})"},
+        {"header": f"{header} ({ctx['prev_period']})", "detail": f"{rupees(before)} ({entries_label(before_count)})"},
+        {"header": "Change", "detail": f"{rupees(now - before)} ({change_label(now, before)})"},
+    ]}
+
+def answer_query(ctx, make_header):
+    # Returns (intent, chat) for queries answerable from the summaries, else (None, None).
+    # A wrong local number is worse than an LLM round trip, so any word the rules don't
+    # understand defers the whole query.
+    q = ctx["query"].lower()
+    if not q or has_any(q, OPEN_ENDED_WORDS) or ("income" in q and "expense" in q):
+        return None, None
+    m_range = RANGE_RE.search(q)
+    m_top = TOP_RE.search(q)
+    rest = q
+    for match in (m_range, m_top):
+        if match:
+            rest = blank(rest, *match.span())
+    tables = (lookup_tables(ctx["current"]), lookup_tables(ctx["previous"]))
+    keys, rest = find_keys(tables, rest)
+    if unresolved(rest):
+        return None, None
+    compare = has_any(q, COMPARE_WORDS)
+    use_prev = has_any(q, PREV_WORDS) and not compare
+    summary = ctx["previous"] if use_prev else ctx["current"]
+    period_tables = tables[1] if use_prev else tables[0]
+    label = ctx["prev_period"] if use_prev else ctx["period"]
+
+    if m_range or m_top:
+        # date ranges and top-N are over all spend, not per name
+        if keys:
+            return None, None
+        if m_range:
+            chat = range_answer(ctx, q)
+            return ("date_range", chat) if chat else (None, None)
+        return "top_n", top_answer(summary, period_tables, m_top, label)
+    if len(keys) > 1:
+        if len(keys) == 2 and compare and not has_any(q, PREV_WORDS):
+            return "compare", keys_answer(ctx, tables[0], keys)
+        return None, None
+    key = keys[0] if keys else None
+    if compare:
+        chat = compare_answer(ctx, tables, key)
+        chat["header"] = make_header(ctx["query"], str(key[1])) if key else "Comparison / Trend"
+        return "compare", chat
+
+    wants_count = has_any(q, COUNT_WORDS)
+    wants_amount = has_any(q, AMOUNT_WORDS) or q.startswith(("spend by", "spend on", "spent on"))
+    if key and (wants_count or wants_amount):
+        field, name, _ = key
+        amount, count = key_totals(period_tables, field, name)
+        preposition = "via" if field == "method" else "at" if field == "merchant" else "in"
+        detail = f"{entries_label(count)} totalling {rupees(amount)}" if wants_count and not wants_amount else f"{rupees(amount)} {preposition} {name} ({entries_label(count)})"
+        return "lookup", {"header": make_header(ctx["query"], str(name)), "entries": [{"header": label, "detail": detail}]}
+    if key:
+        return None, None
+    if "income" in q and not wants_count:
+        count = sum(row["count"] for row in summary["income_summary"])
+        return "total", {"header": make_header(ctx["query"]), "entries": [{"header": f"Total Income ({label})", "detail": f"{rupees(summary['income_total'])} ({entries_label(count)})"}]}
+    if wants_amount and ("total" in q or "how much" in q or "all" in q):
+        count = sum(row["count"] for row in summary["expense_summary"])
+        return "total", {"header": make_header(ctx["query"]), "entries": [{"header": f"Total Expense ({label})", "detail": f"{rupees(summary['expense_total'])} ({entries_label(count)})"}]}
+    if wants_count and "transaction" in q:
+        count = len(summary["transactions"])
+        return "count", {"header": make_header(ctx["query"]), "entries": [{"header": f"Transactions ({label})", "detail": f"{count} transactions"}]}
+    return None, None
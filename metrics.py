@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+LOG_JSON = os.environ.get("INSIGHT_LOG_JSON", "0") == "1"
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+HISTOGRAMS = {
+    "insight_stage_seconds": ("Time spent per /ai-insight stage", SECONDS_BUCKETS),
+    "http_request_seconds": ("End-to-end request latency", SECONDS_BUCKETS),
+    "http_request_payload_bytes": ("Request body size", BYTES_BUCKETS),
+    "llm_prompt_tokens": ("Prompt tokens per completion (OpenAI usage)", TOKEN_BUCKETS),
+    "llm_completion_tokens": ("Completion tokens per completion (OpenAI usage)", TOKEN_BUCKETS),
+}
+COUNTERS = {
+    "llm_requests_total": "LLM gateway events by outcome (ok, retries, errors, busy, timeouts, coalesced)",
+    "llm_tokens_total": "Tokens reported by the OpenAI usage field",
+    "insight_parse_errors_total": "LLM responses that failed to parse as JSON",
+    "insight_responses_total": "LLM responses by parse outcome (ok, repaired, failed)",
+    "insight_fast_path_total": "Requests answered without calling the LLM",
+    "insight_stage_cpu_seconds_total": "Thread CPU time per /ai-insight stage",
+}
+
+lock = threading.Lock()
+histograms = {}
+counters = {}
+log = logging.getLogger("insight.metrics")
+if LOG_JSON and not log.handlers:
+    # One JSON object per line on stdout, independent of the app/gunicorn log format
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+NULL_SPAN = nullcontext()
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    buckets = HISTOGRAMS[name][1]
+    with lock:
+        series = histograms.setdefault(name, {}).get(label_key(labels))
+        if series is None:
+            series = histograms[name][label_key(labels)] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series["buckets"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+def inc(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    with lock:
+        series = counters.setdefault(name, {})
+        key = label_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+class Span:
+    # Wall and thread CPU time of one stage. Under gevent the thread is shared, so CPU
+    # for a stage that waits (llm) also includes other greenlets run in the meantime;
+    # on an event loop it would be the whole loop's, so asgi.py records wall time only.
+    __slots__ = ("stage", "scope", "start", "cpu_start")
+
+    def __init__(self, stage, scope, cpu=True):
+        self.stage = stage
+        self.scope = scope
+        self.cpu_start = 0.0 if cpu else None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.cpu_start is not None:
+            self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        observe("insight_stage_seconds", elapsed, stage=self.stage)
+        if self.scope is not None:
+            stages = self.scope["stages"]
+            stages[self.stage] = stages.get(self.stage, 0) + elapsed
+        if self.cpu_start is not None:
+            cpu = time.thread_time() - self.cpu_start
+            inc("insight_stage_cpu_seconds_total", cpu, stage=self.stage)
+            if self.scope is not None:
+                cpu_stages = self.scope["cpu"]
+                cpu_stages[self.stage] = cpu_stages.get(self.stage, 0) + cpu
+        return False
+
+def span(stage, scope=None, cpu=True):
+    # Request-scoped timing; a shared no-op context when metrics are disabled
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(stage, scope, cpu)
+
+def start_request(endpoint, payload_bytes):
+    if not ENABLED:
+        return None
+    observe("http_request_payload_bytes", payload_bytes, endpoint=endpoint)
+    return {"endpoint": endpoint, "payload_bytes": payload_bytes, "start": time.perf_counter(), "stages": {}, "cpu": {}}
+
+def record_usage(usage):
+    if not ENABLED or usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    inc("llm_tokens_total", prompt_tokens, kind="prompt")
+    inc("llm_tokens_total", completion_tokens, kind="completion")
+    observe("llm_prompt_tokens", prompt_tokens)
+    observe("llm_completion_tokens", completion_tokens)
+
+def finish_request(scope, status):
+    if scope is None:
+        return
+    elapsed = time.perf_counter() - scope.pop("start")
+    observe("http_request_seconds", elapsed, endpoint=scope["endpoint"], status=str(status))
+    if LOG_JSON:
+        log.info(json.dumps({
+            **scope,
+            "status": status,
+            "seconds": round(elapsed, 6),
+            "stages": {stage: round(seconds, 6) for stage, seconds in scope["stages"].items()},
+            "cpu": {stage: round(seconds, 6) for stage, seconds in scope["cpu"].items()},
+        }, default=str))
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(gauges=None):
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    with lock:
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for key, series in histograms.get(name, {}).items():
+                for bound, count in zip(buckets, series["buckets"]):
+                    lines.append(f"{name}_bucket{format_labels(key, [('le', format_number(bound))])} {count}")
+                lines.append(f"{name}_bucket{format_labels(key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{name}_sum{format_labels(key)} {format_number(series['sum'])}")
+                lines.append(f"{name}_count{format_labels(key)} {series['count']}")
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for key, value in counters.get(name, {}).items():
+                lines.append(f"{name}{format_labels(key)} {format_number(value)}")
+    for name, (help_text, kind, samples) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            lines.append(f"{name}{format_labels(label_key(labels))} {format_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,121 @@
+import os
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency; a chars/4 estimate is used without it
+    tiktoken = None
+
+from formatting import compact_rupees
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 6000))
+PROMPT_TOP_MERCHANTS = int(os.environ.get("PROMPT_TOP_MERCHANTS", 25))
+PROMPT_TOP_CATEGORIES = int(os.environ.get("PROMPT_TOP_CATEGORIES", 15))
+PROMPT_MIN_ROWS = 3
+
+# (prompt block, period, summary key, name field, noun for the rolled-up tail)
+BLOCKS = (
+    ("category_summary", "current", "expense_summary", "category", "categories"),
+    ("category_summary_prev", "previous", "expense_summary", "category", "categories"),
+    ("income_summary", "current", "income_summary", "category", "categories"),
+    ("income_summary_prev", "previous", "income_summary", "category", "categories"),
+    ("merchant_summary", "current", "merchant_summary", "merchant", "merchants"),
+    ("merchant_summary_prev", "previous", "merchant_summary", "merchant", "merchants"),
+    ("payment_summary", "current", "payment_summary", "method", "methods"),
+    ("payment_summary_prev", "previous", "payment_summary", "method", "methods"),
+)
+
+stats = {"prompts": 0, "tokens": 0, "tokens_saved": 0, "over_budget": 0}
+stats_lock = threading.Lock()
+_encoding = None
+
+def estimate_tokens(text):
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def compact_name(name):
+    return str(name).replace("|", "/").replace(";", ",")
+
+def truncate_rows(rows, field, top_n, noun):
+    # Keep the top_n rows by amount and roll the tail into one "Other (k ...)" row
+    if len(rows) <= top_n:
+        return rows
+    ranked = sorted(rows, key=lambda row: row["amount"], reverse=True)
+    kept, tail = ranked[:top_n], ranked[top_n:]
+    other = {field: f"Other ({len(tail)} {noun})", "amount": sum(row["amount"] for row in tail)}
+    if "count" in tail[0]:
+        other["count"] = sum(row["count"] for row in tail)
+    return kept + [other]
+
+def encode_rows(rows, field):
+    if not rows:
+        return "none"
+    return ";".join(
+        f"{compact_name(row[field])}|{compact_rupees(row['amount'])}" + (f"|{row['count']}" if "count" in row else "")
+        for row in rows
+    )
+
+def compact_blocks(ctx, top_merchants, top_categories):
+    blocks = {}
+    for name, period_key, summary_key, field, noun in BLOCKS:
+        top_n = top_merchants if field == "merchant" else top_categories
+        blocks[name] = encode_rows(truncate_rows(ctx[period_key][summary_key], field, top_n, noun), field)
+    return blocks
+
+def json_block_chars(rows, sample=64):
+    # Length of the JSON block the prompt used to inline for these rows,
+    # [{"merchant":"X","amount":"\u20b91.00","count":2},...], counted without building it;
+    # long blocks are scaled up from evenly spaced sample rows
+    if len(rows) > sample:
+        step = len(rows) / sample
+        return json_block_chars([rows[int(i * step)] for i in range(sample)]) * len(rows) // sample
+    chars = 1 + max(1, len(rows))
+    for row in rows:
+        chars += 1 + len(row)
+        for key, value in row.items():
+            chars += len(key) + 3
+            if key == "amount":
+                chars += len(f"{value:.2f}") + 8
+            else:
+                chars += len(str(value)) + (2 if isinstance(value, str) else 0)
+    return chars
+
+def fit_prompt(ctx, render, budget=None):
+    # Shrinks the merchant/category top-N until the rendered prompt fits the token budget.
+    # Totals are rendered from the exact summaries, so truncation never changes them.
+    budget = budget or PROMPT_TOKEN_BUDGET
+    top_merchants, top_categories = PROMPT_TOP_MERCHANTS, PROMPT_TOP_CATEGORIES
+    while True:
+        blocks = compact_blocks(ctx, top_merchants, top_categories)
+        prompt = render(blocks)
+        tokens = estimate_tokens(prompt)
+        if tokens <= budget or (top_merchants <= PROMPT_MIN_ROWS and top_categories <= PROMPT_MIN_ROWS):
+            break
+        top_merchants = max(PROMPT_MIN_ROWS, top_merchants // 2)
+        top_categories = max(PROMPT_MIN_ROWS, top_categories // 2)
+    # tokens_saved is estimated from block lengths (chars/4) rather than by rendering
+    # and tokenizing the uncompacted prompt on every request
+    full_chars = sum(json_block_chars(ctx[period_key][summary_key]) for _, period_key, summary_key, _, _ in BLOCKS)
+    full_tokens = tokens + max(0, full_chars - sum(map(len, blocks.values()))) // 4
+    report = {
+        "tokens": tokens,
+        "full_tokens": full_tokens,
+        "tokens_saved": full_tokens - tokens,
+        "top_merchants": top_merchants,
+        "top_categories": top_categories,
+        "over_budget": tokens > budget,
+    }
+    with stats_lock:
+        stats["prompts"] += 1
+        stats["tokens"] += tokens
+        stats["tokens_saved"] += report["tokens_saved"]
+        stats["over_budget"] += int(report["over_budget"])
+    return prompt, report
+
+def snapshot():
+    with stats_lock:
+        return dict(stats)
@@ -0,0 +1,115 @@
+import re
+
+# Rule tables for the chat help tip and header, in priority order: the first rule
+# whose keyword groups all occur in the lower-cased query wins. A rule is
+# (result, group, ...) and a group matches when any of its keywords is a substring.
+HELP_TIP_RULES = [
+    ("Tip: Tap on the 'Report' page, then tap the PDF icon in the top-right corner to download/export your report.",
+     ("download report", "export report", "save report", "report pdf")),
+    ("Tip: Tap on the 'Insight' page, then tap the PDF icon in the top-right corner to download/export insights.",
+     ("download insight", "export insight", "insight pdf", "save insight")),
+    ("Tip: Go to Settings, then tap on 'Back up/Restore' to export your transactions as Excel files.",
+     ("download transaction", "export transaction", "backup transaction", "download excel", "export excel", "save excel")),
+    ("Tip: Go to Settings, then tap on 'Back up/Restore' to upload/restore transactions from an Excel file.",
+     ("upload transaction", "restore transaction", "import transaction", "restore excel", "import excel")),
+    ("Tip: The app will automatically back up your data daily to Google Cloud.",
+     ("backup",)),
+    ("Tip: You can import Google Pay or PhonePe screenshots—use the import feature in the app for automatic transaction extraction.",
+     ("import",), ("google pay", "phonepe", "screenshot")),
+    ("Tip: For transaction details, tap the payee in the Reports page for a full breakdown.",
+     ("payee", "person", "who", "to whom")),
+    ("Tip: For date-wise or date-related queries, tap the category or Payment in the Reports for a full breakdown.",
+     ("date wise", "by date", "datewise", "on which date", "all transactions", "each day")),
+    ("Tip: For category details or summary queries, tap the category in the Reports for a full breakdown.",
+     ("category", "categorywise", "grouped by category")),
+    ("Tip: For payment details or summary queries, tap Payment in the Reports for a full breakdown.",
+     ("payment method", "upi", "cash", "card", "payment summary")),
+    ("Tip: For month-wise or summary queries, tap the Month in the Reports for a full breakdown.",
+     ("month wise", "month summary", "monthly", "this month", "last month")),
+    ("Tip: For more details, explore the Reports page for a full breakdown.",
+     ("detail", "details", "summary")),
+]
+
+# Header for a query about a specific category/merchant ("{}" is the matched key)
+KEY_HEADER_RULES = [
+    ("{} Spend", ("how much", "total", "spent", "cost")),
+    ("{} Order Count", ("how many", "count", "order")),
+    ("{} Details", ("list", "show", "all", "details")),
+]
+KEY_HEADER_DEFAULT = "{} Query"
+
+# Header for any other query; without a match the query itself is the header
+HEADER_RULES = [
+    ("Personal Expense", ("personal expense",)),
+    ("Subscription Expense", ("subscription",)),
+    ("Comparison / Trend", ("compare", "trend")),
+    ("Expense Summary", ("summary",)),
+    ("Income Overview", ("income",)),
+]
+
+RULE_TABLES = {"tip": HELP_TIP_RULES, "key_header": KEY_HEADER_RULES, "header": HEADER_RULES}
+
+def trie_pattern(words):
+    # Alternation factored by common prefix, so each query position is tested
+    # against a handful of first characters instead of every keyword
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return trie_regex(trie)
+
+def trie_regex(node):
+    branches = [re.escape(ch) + trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # a keyword ends here; still prefer the longer keyword
+        body = "(?:" + body + ")?"
+    return body
+
+def compile_rules(tables):
+    # Returns (scanner, hits, group counts). The scanner matches the longest keyword
+    # starting at a position; hits maps that keyword to the (table, rule, group)
+    # entries of it and of every keyword it starts with.
+    groups = {}
+    counts = {}
+    for table, rules in tables.items():
+        for index, (_, *keyword_groups) in enumerate(rules):
+            counts[table, index] = len(keyword_groups)
+            for group_index, keywords in enumerate(keyword_groups):
+                for keyword in keywords:
+                    groups.setdefault(keyword, set()).add((table, index, group_index))
+    hits = {keyword: tuple(sorted(hit for prefix, found in groups.items() if keyword.startswith(prefix) for hit in found))
+            for keyword in groups}
+    return re.compile(trie_pattern(groups)), hits, counts
+
+SCANNER, KEYWORD_HITS, GROUP_COUNTS = compile_rules(RULE_TABLES)
+
+def match_query(query):
+    # One scan of the query -> {table: winning result or None} for every rule table
+    q = query.lower()
+    found = set()
+    match = SCANNER.search(q)
+    while match:
+        found.update(KEYWORD_HITS[match.group()])
+        # resume one character in, so keywords overlapping this one are still seen
+        match = SCANNER.search(q, match.start() + 1)
+    matched = dict.fromkeys(RULE_TABLES)
+    # sorted hits are in (table, priority) order, so the first complete rule wins
+    for table, index, _ in sorted(found):
+        if matched[table] is None and all((table, index, group_index) in found
+                                          for group_index in range(GROUP_COUNTS[table, index])):
+            matched[table] = RULE_TABLES[table][index][0]
+    return matched
+
+def help_tip(query):
+    return match_query(query)["tip"]
+
+def query_header(query, key_match=None, matched=None):
+    matched = matched or match_query(query)
+    if key_match:
+        return (matched["key_header"] or KEY_HEADER_DEFAULT).format(key_match.strip().title())
+    return matched["header"] or query.strip().capitalize()[:40] or "Chat Query"
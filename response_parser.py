@@ -0,0 +1,274 @@
+import json
+import os
+import re
+import threading
+import time
+
+import metrics
+
+NULL_VALUES = (None, "", "null", "none", "-", "NaN")
+FALLBACK_VALUES = (None, "", "null", "none", "N/A", "-", "NaN")
+EMPTY_CHAT_ENTRY = {"header": "", "detail": "Unable to get this data. Tip: Try a different keyword or see Reports."}
+DATE_HEADER_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+KEY_TAIL_RE = re.compile(r'[{,]\s*"(?:[^"\\]|\\.)*"$')
+PARTIAL_LITERAL_RE = re.compile(r"(?<=[\[:,])\s*(?:t|tr|tru|f|fa|fal|fals|n|nu|nul|-)$")
+NUMBER_TAIL_RE = re.compile(r"(?<=\d)(?:\.|[eE][+-]?)$")
+RESPONSE_RECORD_PATH = os.environ.get("RESPONSE_RECORD_PATH")
+MISSING = object()
+
+# Declared shape of a model response: field -> expected type, default when missing
+INSIGHT_GROUP_SCHEMA = {"header": (str, ""), "detail": (str, ""), "type": (str, ""), "category": (str, ""),
+                        "transactions": (list, [])}
+CHAT_SCHEMA = {"header": (str, ""), "entries": (list, [])}
+
+stats = {"responses": 0, "repaired": 0, "failed": 0, "schema_fixes": 0}
+stats_lock = threading.Lock()
+record_lock = threading.Lock()
+
+class ResponseParseError(ValueError):
+    pass
+
+def strip_code_fences(response_text):
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:].strip("`").strip()
+    elif response_text.startswith("```"):
+        response_text = response_text[3:].strip("`").strip()
+    return response_text
+
+def trim_dangling(text, stack):
+    # Drops whatever a truncation left half-written at the end: a trailing comma,
+    # a key without its value, a partial true/false/null or a number cut at "." or "e"
+    while True:
+        stripped = text.rstrip()
+        if stripped.endswith(","):
+            text = stripped[:-1]
+        elif stripped.endswith(":"):
+            match = KEY_TAIL_RE.search(stripped[:-1].rstrip())
+            text = stripped[:match.start() + 1] if match else stripped[:-1]
+        elif stack and stack[-1] == "}" and KEY_TAIL_RE.search(stripped):
+            text = stripped[:KEY_TAIL_RE.search(stripped).start() + 1]
+        elif PARTIAL_LITERAL_RE.search(stripped):
+            text = stripped[:PARTIAL_LITERAL_RE.search(stripped).start()]
+        elif NUMBER_TAIL_RE.search(stripped):
+            text = stripped[:NUMBER_TAIL_RE.search(stripped).start()]
+        else:
+            return stripped
+
+def repair_json(text):
+    # Best-effort local fix for truncated or slightly malformed output: skips prose
+    # before the first "{", drops trailing commas and text after the top-level object,
+    # and closes unterminated strings, arrays and objects. When the text was cut off
+    # inside an array, the unfinished element of the outermost open array is dropped, so
+    # a group or entry cut mid-string is left out rather than served half-written.
+    # Returns None if hopeless.
+    start = text.find("{")
+    if start < 0:
+        return None
+    out = []
+    stack = []
+    # per open container: for arrays, the end of the last complete element in out
+    marks = []
+    in_string = escape = False
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if marks and marks[-1] is not None:
+                    marks[-1] = len(out)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            marks.append(len(out) + 1 if ch == "[" else None)
+        elif ch == "," and marks and marks[-1] is not None:
+            marks[-1] = len(out)
+        elif ch in "}]":
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()
+            if not stack:
+                break
+            out.append(stack.pop())
+            marks.pop()
+            if not stack:
+                break
+            if marks[-1] is not None:
+                marks[-1] = len(out)
+            continue
+        out.append(ch)
+    arrays = [i for i, mark in enumerate(marks) if mark is not None]
+    if arrays:
+        i = arrays[0]
+        out, stack = out[:marks[i]], stack[:i + 1]
+    elif in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    repaired = "".join(out)
+    if stack:
+        repaired = trim_dangling(repaired, stack) + "".join(reversed(stack))
+    try:
+        json.loads(repaired)
+    except ValueError:
+        return None
+    return repaired
+
+def coerce(value, schema):
+    # Returns (dict with every schema field typed, number of fixes)
+    fixes = 0
+    for field, (kind, default) in schema.items():
+        current = value.get(field, MISSING)
+        if type(current) is kind:
+            continue
+        if current is MISSING:
+            value[field] = list(default) if kind is list else default
+        elif not isinstance(current, kind):
+            if kind is str:
+                value[field] = "" if current is None else str(current)
+            elif isinstance(current, dict):
+                value[field] = [current]
+            else:
+                value[field] = list(default)
+            fixes += 1
+    return value, fixes
+
+def validate_group(group):
+    # Groups without a header or detail are dropped (returned as None)
+    if not isinstance(group, dict) or not (group.get("header") or group.get("detail")):
+        return None, 1
+    return coerce(group, INSIGHT_GROUP_SCHEMA)
+
+def validate(resp):
+    # Coerces a parsed response to {"chat": {...}, "insight_groups": [...]} (either may be absent)
+    fixes = 0
+    if isinstance(resp, list):
+        resp, fixes = {"insight_groups": resp}, 1
+    elif not isinstance(resp, dict):
+        return {}, 1
+    if "insight_groups" in resp:
+        groups = resp["insight_groups"]
+        if isinstance(groups, dict):
+            groups, fixes = [groups], fixes + 1
+        elif not isinstance(groups, list):
+            groups, fixes = [], fixes + 1
+        valid = []
+        for group in groups:
+            group, group_fixes = validate_group(group)
+            fixes += group_fixes
+            if group is not None:
+                valid.append(group)
+        resp["insight_groups"] = valid
+    if "chat" in resp:
+        chat = resp["chat"]
+        if isinstance(chat, list):
+            chat, fixes = {"entries": chat}, fixes + 1
+        elif isinstance(chat, str):
+            chat, fixes = {"entries": [{"header": "", "detail": chat}]}, fixes + 1
+        elif not isinstance(chat, dict):
+            chat, fixes = {"entries": []}, fixes + 1
+        chat, chat_fixes = coerce(chat, CHAT_SCHEMA)
+        resp["chat"] = chat
+        fixes += chat_fixes
+    return resp, fixes
+
+def record_raw_response(text):
+    # Appends raw model output to RESPONSE_RECORD_PATH for benchmarks/bench_responses.py
+    if not RESPONSE_RECORD_PATH:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "raw": text}, ensure_ascii=False)
+    with record_lock, open(RESPONSE_RECORD_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+def has_content(resp):
+    chat = resp.get("chat")
+    return bool(resp.get("insight_groups") or (isinstance(chat, dict) and chat.get("entries")))
+
+def parse_failed(message):
+    with stats_lock:
+        stats["responses"] += 1
+        stats["failed"] += 1
+    metrics.inc("insight_responses_total", outcome="failed")
+    return ResponseParseError(message)
+
+def parse_response(text):
+    # Raw completion text -> (validated response, report); raises ResponseParseError
+    text = strip_code_fences(text or "")
+    repaired = False
+    try:
+        resp = json.loads(text)
+    except ValueError as e:
+        fixed = repair_json(text)
+        if fixed is None:
+            raise parse_failed(str(e)) from e
+        resp, repaired = json.loads(fixed), True
+    resp, fixes = validate(resp)
+    if repaired and not has_content(resp):
+        # e.g. '{"insight_groups": [' cut off by max_tokens: a failure, not an empty answer
+        raise parse_failed("Model output was cut off before any complete insight group or chat entry")
+    with stats_lock:
+        stats["responses"] += 1
+        stats["repaired"] += int(repaired)
+        stats["schema_fixes"] += fixes
+    metrics.inc("insight_responses_total", outcome="repaired" if repaired else "ok")
+    return resp, {"repaired": repaired, "schema_fixes": fixes}
+
+def friendly_fallback(value):
+    if value in FALLBACK_VALUES:
+        return "Unable to get. Tip: Tap on Reports for month, category, payment, or payee breakdown."
+    return value
+
+def fix_null_entry(entry):
+    if not isinstance(entry, dict):
+        return entry
+    # Fix header
+    if entry.get("header") in NULL_VALUES:
+        entry["header"] = "Info"
+    # Fix detail/text/value/amount
+    for key in ["detail", "text", "value", "amount"]:
+        if key in entry and entry[key] in NULL_VALUES:
+            entry[key] = "₹0"
+    return entry
+
+def normalize_entry(entry):
+    if not isinstance(entry, dict):
+        return {"header": "", "detail": friendly_fallback(str(entry))}
+    if "amount" in entry and "category" in entry:
+        return {"header": friendly_fallback(entry.get("category", "")), "detail": friendly_fallback(entry.get("amount", ""))}
+    if "title" in entry and "value" in entry:
+        value = entry["value"]
+        if isinstance(value, list):
+            value = "\n".join(str(v) for v in value)
+        return {"header": friendly_fallback(entry.get("title", "")), "detail": friendly_fallback(value)}
+    if "content" in entry:
+        return {"header": friendly_fallback(entry.get("type", "")), "detail": friendly_fallback(entry.get("content", ""))}
+    if "detail" in entry and "header" in entry:
+        return {"header": friendly_fallback(entry.get("header", "")), "detail": friendly_fallback(entry.get("detail", ""))}
+    if "text" in entry:
+        return {"header": "", "detail": friendly_fallback(entry.get("text", ""))}
+    return {"header": "", "detail": friendly_fallback(", ".join(str(v) for v in entry.values()))}
+
+def is_detailed_entry(entry):
+    header = entry.get("header", "")
+    return isinstance(header, str) and bool(DATE_HEADER_RE.match(header))
+
+def process_entries(entries):
+    # Null-fix, normalize and detect date-wise entries in one walk; returns (entries, detailed)
+    normalized = []
+    detailed = False
+    for entry in entries:
+        entry = normalize_entry(fix_null_entry(entry))
+        detailed = detailed or is_detailed_entry(entry)
+        normalized.append(entry)
+    if not normalized:
+        normalized.append(dict(EMPTY_CHAT_ENTRY))
+    return normalized, detailed
+
+def snapshot():
+    with stats_lock:
+        return {**stats, "failure_rate": round(stats["failed"] / stats["responses"], 4) if stats["responses"] else 0.0}
@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+
+from aggregation import merchant_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    user_id TEXT NOT NULL,
+    tx_id TEXT NOT NULL,
+    period TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, tx_id)
+);
+CREATE INDEX IF NOT EXISTS transactions_period ON transactions (user_id, period);
+CREATE TABLE IF NOT EXISTS category_rollup (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    type INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    amount,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, period, type, category)
+);
+CREATE TABLE IF NOT EXISTS merchant_rollup (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    amount,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, period, merchant)
+);
+CREATE TABLE IF NOT EXISTS payment_rollup (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    method TEXT NOT NULL,
+    amount,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, period, method)
+);
+"""
+
+class InvalidTransaction(ValueError):
+    pass
+
+def check_transaction(tx, index=0):
+    # Rows are checked before anything is written: a string Amount would be summed into
+    # the untyped rollup amount column and break every later read of that period
+    where = f"transactions[{index}]"
+    if not isinstance(tx, dict):
+        raise InvalidTransaction(f"{where} must be an object")
+    amount = tx.get("Amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        raise InvalidTransaction(f"{where}.Amount must be a number")
+    if not isinstance(tx.get("Period"), str) or not tx["Period"]:
+        raise InvalidTransaction(f"{where}.Period must be a YYYYMM string")
+    for field in ("Category", "Merchant", "Transaction", "Method"):
+        if isinstance(tx.get(field), (dict, list)):
+            raise InvalidTransaction(f"{where}.{field} must be a string")
+
+def transaction_id(tx):
+    # Rows without a client id get a new server id: two identical purchases are two rows
+    tx_id = tx.get("id", tx.get("Id"))
+    return str(tx_id) if tx_id is not None and tx_id != "" else uuid.uuid4().hex
+
+def settle(amount):
+    # Incremental +/- updates leave float residue; amounts are in paise precision
+    return round(amount, 2) if isinstance(amount, float) else amount
+
+def encode_key(value):
+    # Keys are JSON encoded so None/int categories round-trip exactly
+    return json.dumps(value, ensure_ascii=False)
+
+class PeriodTransactions:
+    # Raw transactions of one period, loaded only when a fast path needs them
+    def __init__(self, store, user_id, period):
+        self.store = store
+        self.user_id = user_id
+        self.period = period
+        self.rows = None
+
+    def load(self):
+        if self.rows is None:
+            self.rows = self.store.transactions(self.user_id, self.period)
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __bool__(self):
+        return bool(self.load())
+
+class StagedUpload:
+    # A bulk restore staged in a temp table as rows arrive, which takes no lock on the
+    # store, then written in one transaction: a bad row or a dropped upload writes nothing
+    def __init__(self, store):
+        self.store = store
+        self.conn = store.connect()
+        self.conn.execute("CREATE TEMP TABLE upload (data TEXT NOT NULL)")
+        self.count = 0
+
+    def add(self, tx):
+        check_transaction(tx, self.count)
+        self.conn.execute("INSERT INTO upload (data) VALUES (?)", (json.dumps(tx, ensure_ascii=False),))
+        self.count += 1
+
+    def commit(self, user_id):
+        conn = self.conn
+        conn.commit()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT data FROM upload ORDER BY rowid")
+            return [self.store.write(conn, user_id, json.loads(data)) for data, in rows]
+
+    def close(self):
+        self.conn.close()
+
+class TransactionStore:
+    # Per-user transactions with rollups maintained incrementally on every write
+    def __init__(self, path):
+        self.path = path
+        with closing(self.connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def apply(self, conn, user_id, tx, sign):
+        period = tx.get("Period")
+        if period is None:
+            return
+        amt = tx.get("Amount", 0)
+        tx_type = tx.get("Type")
+        targets = [("merchant_rollup", "merchant", encode_key(merchant_key(tx)), ()),
+                   ("payment_rollup", "method", encode_key(tx.get("Method", "Unknown")), ())]
+        if tx_type == 0 or tx_type == 1:
+            targets.insert(0, ("category_rollup", "category", encode_key(tx.get("Category", "Unknown")), (("type", int(tx_type)),)))
+        for table, column, key, extra in targets:
+            where = " AND ".join(["user_id = ?", "period = ?", f"{column} = ?"] + [f"{name} = ?" for name, _ in extra])
+            params = [user_id, period, key] + [value for _, value in extra]
+            row = conn.execute(f"SELECT count FROM {table} WHERE {where}", params).fetchone()
+            if row is None:
+                if sign < 0:
+                    continue
+                columns = ["user_id", "period", column] + [name for name, _ in extra] + ["amount", "count"]
+                conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", params + [amt, 1])
+            elif row[0] + sign <= 0:
+                conn.execute(f"DELETE FROM {table} WHERE {where}", params)
+            else:
+                conn.execute(f"UPDATE {table} SET amount = amount + ?, count = count + ? WHERE {where}", [sign * amt, sign] + params)
+
+    def write(self, conn, user_id, tx):
+        tx_id = transaction_id(tx)
+        row = conn.execute("SELECT data FROM transactions WHERE user_id = ? AND tx_id = ?", (user_id, tx_id)).fetchone()
+        if row:
+            stored = json.loads(row[0])
+            if stored == tx:
+                # unchanged re-upload: leave the rollups, and so the insight digest, as they are
+                return tx_id
+            self.apply(conn, user_id, stored, -1)
+        self.apply(conn, user_id, tx, 1)
+        conn.execute("INSERT OR REPLACE INTO transactions (user_id, tx_id, period, data) VALUES (?, ?, ?, ?)",
+                     (user_id, tx_id, tx.get("Period"), json.dumps(tx, ensure_ascii=False)))
+        return tx_id
+
+    def upsert(self, user_id, tx_list):
+        for index, tx in enumerate(tx_list):
+            check_transaction(tx, index)
+        with closing(self.connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return [self.write(conn, user_id, tx) for tx in tx_list]
+
+    def stage(self):
+        return StagedUpload(self)
+
+    def delete(self, user_id, tx_ids):
+        deleted = 0
+        with closing(self.connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for tx_id in tx_ids:
+                row = conn.execute("SELECT data FROM transactions WHERE user_id = ? AND tx_id = ?", (user_id, str(tx_id))).fetchone()
+                if not row:
+                    continue
+                self.apply(conn, user_id, json.loads(row[0]), -1)
+                conn.execute("DELETE FROM transactions WHERE user_id = ? AND tx_id = ?", (user_id, str(tx_id)))
+                deleted += 1
+        return deleted
+
+    def transactions(self, user_id, period):
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT data FROM transactions WHERE user_id = ? AND period = ? ORDER BY rowid", (user_id, period)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def summaries(self, conn, user_id, period):
+        def load(sql):
+            return conn.execute(sql, (user_id, period)).fetchall()
+        expense, income = [], []
+        for tx_type, category, amount, count in load("SELECT type, category, amount, count FROM category_rollup WHERE user_id = ? AND period = ? ORDER BY rowid"):
+            (expense if tx_type == 0 else income).append({"category": json.loads(category), "amount": settle(amount), "count": count})
+        merchants = [{"merchant": json.loads(merchant), "amount": settle(amount), "count": count}
+                     for merchant, amount, count in load("SELECT merchant, amount, count FROM merchant_rollup WHERE user_id = ? AND period = ? ORDER BY rowid")]
+        payments = [{"method": json.loads(method), "amount": settle(0 + amount)}
+                    for method, amount in load("SELECT method, amount FROM payment_rollup WHERE user_id = ? AND period = ? ORDER BY rowid")]
+        return {
+            "expense_summary": expense,
+            "income_summary": income,
+            "merchant_summary": merchants,
+            "payment_summary": payments,
+            "expense_total": sum(item["amount"] for item in expense),
+            "income_total": sum(item["amount"] for item in income),
+            "transactions": PeriodTransactions(self, user_id, period),
+        }
+
+    def aggregate_periods(self, user_id, periods):
+        with closing(self.connect()) as conn:
+            return {p: self.summaries(conn, user_id, p) for p in periods}
+
+_store = None
+
+def get_transaction_store():
+    global _store
+    if _store is None:
+        _store = TransactionStore(os.environ.get("TRANSACTION_STORE_PATH", "transactions.db"))
+    return _store
@@ -0,0 +1,73 @@
+import json
+
+class EntryStreamParser:
+    # Incrementally scans streamed completion text and yields each element of
+    # "insight_groups" (top level) or "chat.entries" as soon as it is complete.
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = None
+
+    def feed(self, text):
+        self.buf += text
+        found = []
+        buf = self.buf
+        stack = self.stack
+        i = self.pos
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    try:
+                        self.last_string = json.loads(buf[self.string_start:i + 1])
+                    except ValueError:
+                        self.last_string = None
+                    if stack and stack[-1]["type"] == "arr" and stack[-1]["kind"]:
+                        found.append((stack[-1]["kind"], self.last_string))
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch == ":":
+                if stack and stack[-1]["type"] == "obj":
+                    stack[-1]["key"] = self.last_string
+            elif ch == "{" or ch == "[":
+                parent = stack[-1] if stack else None
+                key = parent["key"] if parent and parent["type"] == "obj" else None
+                frame = {"type": "obj" if ch == "{" else "arr", "key": None, "name": key, "kind": None, "start": None}
+                if parent and parent["type"] == "arr" and parent["kind"]:
+                    frame["start"] = i
+                    frame["element_of"] = parent["kind"]
+                if frame["type"] == "arr":
+                    if key == "insight_groups" and len(stack) == 1:
+                        frame["kind"] = "insight"
+                    elif key == "entries" and parent and parent.get("name") == "chat" and len(stack) == 2:
+                        frame["kind"] = "chat"
+                stack.append(frame)
+            elif ch == "}" or ch == "]":
+                if stack:
+                    frame = stack.pop()
+                    if frame["start"] is not None:
+                        try:
+                            found.append((frame["element_of"], json.loads(buf[frame["start"]:i + 1])))
+                        except ValueError:
+                            pass
+            elif ch == ",":
+                if stack and stack[-1]["type"] == "obj":
+                    stack[-1]["key"] = None
+            i += 1
+        self.pos = i
+        return found
+
+    @property
+    def text(self):
+        return self.buf
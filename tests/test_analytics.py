@@ -0,0 +1,53 @@
+from aggregation import SUMMARY_KEYS, aggregate_periods
+from analytics import budget_group, compute_facts, recurring_micro_spends, transaction_facts
+from formatting import compact_rupees, pct_change, rupees
+from local_answers import change_label
+
+def test_micro_spends_use_the_aggregation_merchant_key():
+    # No Merchant/Transaction/Category: grouped under the method, as in merchant_summary
+    tx_list = [{"Type": 0, "Amount": 20, "Method": "UPI"}] * 3 + [{"Type": 0, "Amount": 30, "Merchant": "Tea"}] * 2
+    assert recurring_micro_spends(tx_list) == [{"name": "UPI", "count": 3, "amount": 60}]
+
+def test_amount_formats():
+    assert rupees(1234.5) == "₹1,234.50"
+    assert rupees(-20) == "-₹20.00"
+    assert compact_rupees(1234) == "₹1234"
+    assert compact_rupees(1234.5) == "₹1234.50"
+    assert compact_rupees(-20) == "-₹20"
+
+def test_change_formats():
+    assert pct_change(150, 100) == 50
+    assert pct_change(10, 0) is None
+    assert change_label(150, 100) == "+50%"
+    assert change_label(10, 0) == "new this period"
+    assert change_label(0, 0) == "no change"
+
+def budget_context(budget, days_left, period="202406", spent=2400):
+    return {"budget": budget, "days_left": days_left, "period": period, "current_month": "202406",
+            "current": {"expense_total": spent}}
+
+def test_budget_group():
+    assert budget_group(budget_context(5000, 12))["detail"] == (
+        "₹2,600.00 left of your ₹5,000.00 budget (₹2,400.00 spent), about ₹216.67 a day for the 12 days left.")
+    over = budget_group(budget_context(1000, 3))
+    assert over["header"] == "Budget Alert"
+    assert over["detail"] == "₹2,400.00 spent, ₹1,400.00 over your ₹1,000.00 budget with 3 days left."
+
+def test_budget_group_only_for_the_current_month_with_a_budget():
+    assert budget_group(budget_context(5000, 12, period="202405")) is None
+    assert budget_group(budget_context(0, 12)) is None
+    assert budget_group(budget_context(None, None)) is None
+
+def facts_context(tx_list):
+    aggregated = aggregate_periods(tx_list, ["202406", "202405"])
+    return {"current": aggregated["202406"], "previous": aggregated["202405"]}
+
+def test_transaction_facts_see_edits_the_summaries_do_not():
+    rows = [{"Period": "202406", "Type": 0, "Category": "Food", "Merchant": "Swiggy", "Amount": amount, "Date": f"2024-06-{day:02d}"}
+            for amount, day in ((900, 3), (80, 5), (60, 7))]
+    moved = [dict(rows[0], Date="2024-06-20"), rows[1], rows[2]]
+    before, after = facts_context(rows), facts_context(moved)
+    assert [before["current"][key] for key in SUMMARY_KEYS] == [after["current"][key] for key in SUMMARY_KEYS]
+    assert transaction_facts(before) != transaction_facts(after)
+    facts = compute_facts(before)
+    assert {key: facts[key] for key in ("top_transactions", "micro_spends")} == transaction_facts(before)
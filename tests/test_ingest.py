@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+
+from ingest import IngestError, iter_body, read_insight_request
+
+def stream(body):
+    return io.BytesIO(json.dumps(body).encode())
+
+def periods_for(period):
+    return [period] if isinstance(period, str) else period
+
+USERS = [{"user_id": f"u{i}", "period": "202406", "note": "ü" * i, "transactions": [{"Amount": i * 1.5, "Period": "202406"}]}
+         for i in range(40)]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_array_items_survive_any_chunk_boundary(chunk_size):
+    body = {"user_id": "u1", "transactions": [{"Amount": 12345.678}, {"Amount": 1e-7}, 42], "tail": [1, 2]}
+    events = list(iter_body(stream(body), chunk_size=chunk_size))
+    assert events == [("field", "user_id", "u1"), ("array", "transactions", None),
+                      ("item", "transactions", {"Amount": 12345.678}), ("item", "transactions", {"Amount": 1e-7}),
+                      ("item", "transactions", 42), ("field", "tail", [1, 2])]
+
+def test_users_are_read_element_by_element():
+    data, aggregated = read_insight_request(stream({"periods": ["202406"], "users": USERS}), periods_for,
+                                            period_key="periods", list_keys=("users",))
+    assert data == {"periods": ["202406"], "users": USERS}
+    assert aggregated is None
+
+def test_large_field_decodes_whole():
+    # Not an array key: decoded as one value across many chunks
+    data, _ = read_insight_request(stream({"users": USERS}), periods_for, period_key="periods")
+    assert data["users"] == USERS
+
+def test_users_that_is_not_a_list_is_left_to_the_caller():
+    data, _ = read_insight_request(stream({"users": 5}), periods_for, period_key="periods", list_keys=("users",))
+    assert data == {"users": 5}
+
+def test_truncated_body_is_an_ingest_error():
+    body = json.dumps({"users": USERS}).encode()[:-40]
+    with pytest.raises(IngestError):
+        read_insight_request(io.BytesIO(body), periods_for, period_key="periods", list_keys=("users",))
@@ -0,0 +1,114 @@
+import pytest
+
+from aggregation import aggregate_periods
+from local_answers import answer_query, find_keys, lookup_tables
+from query_rules import query_header
+
+def tx(category, amount, merchant=None, method="UPI", period="202406", tx_type=0):
+    return {"Period": period, "Type": tx_type, "Category": category, "Amount": amount,
+            "Merchant": merchant, "Method": method, "Date": f"{period[:4]}-{period[4:]}-10"}
+
+TRANSACTIONS = [
+    tx("Rent", 15000, "Landlord", "Bank"),
+    tx("Food", 450, "Swiggy"),
+    tx("Food", 300, "Swiggy Instamart", "Cash"),
+    tx("EMI", 5000, "HDFC", "Bank"),
+    tx("Others", 120, "Kirana", "Cash"),
+    tx("Salary", 60000, "Employer", "Bank", tx_type=1),
+    tx("Food", 200, "Swiggy", period="202405"),
+]
+
+def context(query):
+    aggregated = aggregate_periods(TRANSACTIONS, ["202406", "202405"])
+    return {"period": "202406", "prev_period": "202405", "query": query, "budget": 0, "days_left": 0,
+            "current_month": "202406", "current": aggregated["202406"], "previous": aggregated["202405"]}
+
+def key_name(query):
+    ctx = context(query)
+    keys, _ = find_keys((lookup_tables(ctx["current"]), lookup_tables(ctx["previous"])), query.lower())
+    return keys[0][1] if keys else None
+
+def answer(query):
+    return answer_query(context(query), query_header)
+
+@pytest.mark.parametrize("query", [
+    "how much did I spend in the current month",  # cur-rent
+    "how much did I spend on seafood",            # sea-food
+    "how much for premium items",                 # pr-emi-um
+    "total cashback this month",                  # cash-back
+    "how much did I give my brothers",            # br-others
+])
+def test_names_inside_other_words_are_not_keys(query):
+    assert key_name(query) is None
+    intent, _ = answer_query(context(query), query_header)
+    assert intent != "lookup"
+
+@pytest.mark.parametrize("query, name", [
+    ("how much did I spend on food", "Food"),
+    ("how much on Food?", "Food"),
+    ("total rent", "Rent"),
+    ("how much emi did i pay", "EMI"),
+    ("how much did I pay in cash", "Cash"),
+    ("how much on others", "Others"),
+    ("how much at swiggy instamart", "Swiggy Instamart"),
+    ("how much at swiggy", "Swiggy"),
+])
+def test_whole_word_names_are_keys(query, name):
+    assert key_name(query) == name
+
+def test_current_month_total_is_not_a_rent_lookup():
+    intent, chat = answer_query(context("how much did I spend in the current month"), query_header)
+    assert intent == "total"
+    assert chat["entries"][0]["detail"] == "₹20,870.00 (5 entries)"
+
+def test_lookup_answer():
+    intent, chat = answer_query(context("how much did I spend on food"), query_header)
+    assert intent == "lookup"
+    assert chat["header"] == "Food Spend"
+    assert chat["entries"] == [{"header": "202406", "detail": "₹750.00 in Food (2 entries)"}]
+
+@pytest.mark.parametrize("query", [
+    "how much did I spend on coffee",            # unknown payee
+    "how much did I spend on weekends",
+    "total spent on amazon",
+    "how much did I spend this year",            # time ranges
+    "how much did I spend in the last 3 months",
+    "total spend on swiggy in march",
+    "how many transactions above 1000",          # amount filter
+    "food and rent",                             # two names, no comparison
+    "top 3 merchants for food",                  # top-N is not per name
+    "how much from employer",                    # income payer, not a spend merchant
+])
+def test_queries_the_rules_cannot_answer_go_to_the_llm(query):
+    assert answer(query) == (None, None)
+
+@pytest.mark.parametrize("query", ["UPI vs cash", "difference between upi and cash"])
+def test_two_names_are_compared_with_each_other(query):
+    intent, chat = answer(query)
+    assert intent == "compare"
+    assert chat["entries"] == [
+        {"header": "UPI (202406)", "detail": "₹450.00 (1 entry)"},
+        {"header": "Cash (202406)", "detail": "₹420.00 (2 entries)"},
+        {"header": "Difference", "detail": "₹30.00"},
+    ]
+
+def test_method_lookup_counts_expenses_only():
+    intent, chat = answer("how much did I spend via bank")
+    assert intent == "lookup"
+    assert chat["entries"] == [{"header": "202406", "detail": "₹20,000.00 via Bank (2 entries)"}]
+
+def test_top_payment_methods_rank_expenses_only():
+    intent, chat = answer("top 3 payment methods")
+    assert intent == "top_n"
+    assert [entry["header"] for entry in chat["entries"]] == ["Bank", "UPI", "Cash"]
+    assert chat["entries"][0]["detail"] == "₹20,000.00 (2 entries)"
+
+def test_top_merchants_leave_out_income_payers():
+    intent, chat = answer("top 3 merchants")
+    assert intent == "top_n"
+    assert [entry["header"] for entry in chat["entries"]] == ["Landlord", "HDFC", "Swiggy"]
+
+def test_longer_name_wins_over_the_name_inside_it():
+    intent, chat = answer("how much at swiggy instamart")
+    assert intent == "lookup"
+    assert chat["entries"] == [{"header": "202406", "detail": "₹300.00 at Swiggy Instamart (1 entry)"}]
@@ -0,0 +1,18 @@
+import json
+
+from prompt_builder import json_block_chars
+
+def legacy_block(rows):
+    return json.dumps([{**row, "amount": f"₹{row['amount']:.2f}"} for row in rows], separators=(',', ':'))
+
+def test_json_block_chars_matches_the_legacy_block():
+    rows = [{"merchant": "Swiggy", "amount": 450, "count": 3}, {"merchant": "Big Bazaar", "amount": 1299.5, "count": 1}]
+    assert json_block_chars(rows) == len(legacy_block(rows))
+    payments = [{"method": "UPI", "amount": 12.25}, {"method": None, "amount": 0}]
+    assert json_block_chars(payments) == len(legacy_block(payments))
+    assert json_block_chars([]) == len(legacy_block([]))
+
+def test_json_block_chars_samples_long_blocks():
+    rows = [{"merchant": f"Merchant {i}", "amount": i * 10.5, "count": i % 7 + 1} for i in range(5000)]
+    exact = len(legacy_block(rows))
+    assert abs(json_block_chars(rows) - exact) < exact * 0.02
@@ -0,0 +1,97 @@
+import pytest
+
+from query_rules import help_tip, match_query, query_header
+
+# Today's tip texts, pinned so a table edit that changes an answer fails here
+REPORT = "Tip: Tap on the 'Report' page, then tap the PDF icon in the top-right corner to download/export your report."
+INSIGHT = "Tip: Tap on the 'Insight' page, then tap the PDF icon in the top-right corner to download/export insights."
+EXPORT = "Tip: Go to Settings, then tap on 'Back up/Restore' to export your transactions as Excel files."
+RESTORE = "Tip: Go to Settings, then tap on 'Back up/Restore' to upload/restore transactions from an Excel file."
+BACKUP = "Tip: The app will automatically back up your data daily to Google Cloud."
+SCREENSHOT = ("Tip: You can import Google Pay or PhonePe screenshots—use the import feature in the app "
+              "for automatic transaction extraction.")
+PAYEE = "Tip: For transaction details, tap the payee in the Reports page for a full breakdown."
+DATE = "Tip: For date-wise or date-related queries, tap the category or Payment in the Reports for a full breakdown."
+CATEGORY = "Tip: For category details or summary queries, tap the category in the Reports for a full breakdown."
+PAYMENT = "Tip: For payment details or summary queries, tap Payment in the Reports for a full breakdown."
+MONTH = "Tip: For month-wise or summary queries, tap the Month in the Reports for a full breakdown."
+DETAILS = "Tip: For more details, explore the Reports page for a full breakdown."
+
+@pytest.mark.parametrize("query, tip", [
+    # one case per rule, in table order
+    ("How do I download report?", REPORT),
+    ("export insight as pdf", INSIGHT),
+    ("download excel of my spends", EXPORT),
+    ("restore transaction from excel", RESTORE),
+    ("is my data in backup?", BACKUP),
+    ("import my phonepe screenshot", SCREENSHOT),
+    ("to whom did I pay the most", PAYEE),
+    ("spending date wise", DATE),
+    ("spend by category", CATEGORY),
+    ("how much by upi", PAYMENT),
+    ("monthly spend", MONTH),
+    ("give me details", DETAILS),
+    ("how much did I spend", None),
+    ("", None),
+    # priority conflicts: the earlier rule wins
+    ("backup transaction to excel", EXPORT),   # not the generic "backup" tip
+    ("backup my data", BACKUP),
+    ("import transaction screenshot", RESTORE),  # "import transaction" before "import ... screenshot"
+    ("import google pay history", SCREENSHOT),
+    ("import from the bank", None),           # "import" alone needs a screenshot/app keyword too
+    ("screenshot of google pay", None),
+    ("export report summary", REPORT),        # before "summary"
+    ("who did I pay by card", PAYEE),         # before payment method
+    ("all transactions by category", DATE),   # before category
+    ("category summary this month", CATEGORY),
+    ("cash spent this month", PAYMENT),       # before month
+    ("month summary", MONTH),                 # before the "summary" catch-all
+    # keywords overlapping inside one another are all seen
+    ("show the categorywise split", CATEGORY),
+    ("whole month", PAYEE),                   # "who" inside "whole"
+    ("DOWNLOAD REPORT", REPORT),
+])
+def test_help_tip(query, tip):
+    assert help_tip(query) == tip
+
+@pytest.mark.parametrize("query, header", [
+    ("my personal expense list", "Personal Expense"),
+    ("netflix subscription", "Subscription Expense"),
+    ("compare with last month", "Comparison / Trend"),
+    ("spending trend", "Comparison / Trend"),
+    ("expense summary", "Expense Summary"),
+    ("income this month", "Income Overview"),
+    # priority conflicts
+    ("personal expense subscription summary", "Personal Expense"),
+    ("subscription trend", "Subscription Expense"),
+    ("compare income", "Comparison / Trend"),
+    ("income summary", "Expense Summary"),
+    # no rule: the query itself, capitalized and cut to 40 characters
+    ("  where did my money go  ", "Where did my money go"),
+    ("what are my largest expenses in the period just gone by", "What are my largest expenses in the peri"),
+    ("   ", "Chat Query"),
+])
+def test_query_header(query, header):
+    assert query_header(query) == header
+
+@pytest.mark.parametrize("query, key_match, header", [
+    ("how much on swiggy", "swiggy", "Swiggy Spend"),
+    ("total food", " food ", "Food Spend"),
+    ("how many orders from zomato", "zomato", "Zomato Order Count"),
+    ("count of uber rides", "uber", "Uber Order Count"),
+    ("list amazon purchases", "amazon", "Amazon Details"),
+    ("show rent", "rent", "Rent Details"),
+    ("rent?", "rent", "Rent Query"),
+    # priority conflicts: spend before count before details
+    ("how many and how much at swiggy", "swiggy", "Swiggy Spend"),
+    ("show order count for zomato", "zomato", "Zomato Order Count"),
+    # a key match ignores the generic header rules
+    ("food subscription summary", "food", "Food Query"),
+])
+def test_key_match_header(query, key_match, header):
+    assert query_header(query, key_match) == header
+
+def test_match_query_returns_every_table():
+    assert match_query("compare total cash spend") == {
+        "tip": PAYMENT, "key_header": "{} Spend", "header": "Comparison / Trend"}
+    assert match_query("nothing here") == {"tip": None, "key_header": None, "header": None}
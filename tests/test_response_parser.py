@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from response_parser import ResponseParseError, parse_response, repair_json, validate
+
+FULL = json.dumps({
+    "insight_groups": [
+        {"header": "Spending up", "detail": "Food rose 32% {vs} last month, \"mostly\" Swiggy.", "type": "trend",
+         "category": "Food", "transactions": [{"Amount": 450.5, "Paid": True, "Note": None}]},
+        {"header": "Rent steady", "detail": "₹15,000 as usual.", "type": "info", "category": "Rent", "transactions": []},
+    ],
+    "chat": {"header": "Your month", "entries": [{"header": "Food", "detail": "₹750"}, {"header": "Rent", "detail": "₹15,000"}]},
+}, ensure_ascii=False)
+HEADERS = ["Spending up", "Rent steady"]
+
+def test_complete_response_is_not_repaired():
+    resp, report = parse_response(FULL)
+    assert report == {"repaired": False, "schema_fixes": 0}
+    assert [group["header"] for group in resp["insight_groups"]] == HEADERS
+
+@pytest.mark.parametrize("cut", range(1, len(FULL)))
+def test_every_truncation_fails_or_keeps_a_prefix_of_the_content(cut):
+    # What a max_tokens cut-off can look like at any point of the output
+    try:
+        resp, report = parse_response(FULL[:cut])
+    except ResponseParseError:
+        return
+    assert report["repaired"]
+    headers = [group["header"] for group in resp["insight_groups"]]
+    assert headers == HEADERS[:len(headers)]
+    assert headers or resp.get("chat", {}).get("entries")
+
+@pytest.mark.parametrize("text", [
+    '{"insight_groups": [',
+    '{"insight_groups": [{"header": "Spen',
+    '{"insight_groups": [{"type": "trend", "category": "Fo',
+    '{"chat": {"header": "Your month", "entries": [',
+    "I'm sorry, I can't help with that.",
+    "",
+])
+def test_truncation_with_nothing_complete_is_a_parse_error(text):
+    with pytest.raises(ResponseParseError):
+        parse_response(text)
+
+def test_complete_but_empty_response_is_not_an_error():
+    resp, report = parse_response('{"insight_groups": []}')
+    assert resp == {"insight_groups": []}
+    assert not report["repaired"]
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"chat": {"entries": []}}\n```', {"chat": {"entries": []}}),
+    ('Here you go: {"a": [1, 2,], "b": "x",} Thanks!', {"a": [1, 2], "b": "x"}),
+    ('{"a": "line\\', {"a": "line"}),
+    ('{"a": [true, fal', {"a": [True]}),
+    ('{"a": 1.', {"a": 1}),
+    ('{"a": 1.5e-', {"a": 1.5}),
+    ('{"a": true', {"a": True}),
+    ('{"a": {"b": 2}, "c":', {"a": {"b": 2}}),
+    ("no json here", None),
+])
+def test_repair_json(text, expected):
+    from response_parser import strip_code_fences
+    fixed = repair_json(strip_code_fences(text))
+    assert (json.loads(fixed) if fixed is not None else None) == expected
+
+def test_validate_coerces_shapes():
+    resp, fixes = validate({"insight_groups": {"header": "One", "transactions": {"Amount": 1}},
+                            "chat": "plain text answer"})
+    assert resp == {"insight_groups": [{"header": "One", "detail": "", "type": "", "category": "",
+                                        "transactions": [{"Amount": 1}]}],
+                    "chat": {"header": "", "entries": [{"header": "", "detail": "plain text answer"}]}}
+    assert fixes == 3
+
+def test_validate_drops_groups_without_header_or_detail():
+    resp, fixes = validate([{"header": "", "detail": ""}, "text", {"detail": ""}])
+    assert resp == {"insight_groups": []}
+    assert fixes == 4  # the bare list, then each dropped group
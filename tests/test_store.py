@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+from aggregation import aggregate_periods
+from store import InvalidTransaction, TransactionStore
+
+PERIODS = ["202406", "202405"]
+
+def tx(tx_id, category, amount, merchant=None, method="UPI", period="202406", tx_type=0):
+    return {"id": tx_id, "Period": period, "Type": tx_type, "Category": category, "Amount": amount,
+            "Merchant": merchant, "Method": method}
+
+ROWS = [
+    tx("1", "Food", 450, "Swiggy"),
+    tx("2", "Food", 300.25, "Swiggy", "Cash"),
+    tx("3", "Rent", 15000, "Landlord", "Bank"),
+    tx("4", "Salary", 60000, "Employer", "Bank", tx_type=1),
+    tx("5", "Food", 200, "Swiggy", period="202405"),
+]
+
+@pytest.fixture
+def store(tmp_path):
+    return TransactionStore(str(tmp_path / "transactions.db"))
+
+def rollups(store):
+    # Summaries without the lazily loaded transactions, as from the in-memory aggregator
+    return {period: {key: value for key, value in summary.items() if key != "transactions"}
+            for period, summary in store.aggregate_periods("u1", PERIODS).items()}
+
+def expected(rows):
+    return {period: {key: value for key, value in summary.items() if key != "transactions"}
+            for period, summary in aggregate_periods(rows, PERIODS).items()}
+
+def normalized(summaries):
+    # Rollup rows come back in rowid order, which updates and deletes change
+    return {period: {key: sorted(value, key=repr) if isinstance(value, list) else value for key, value in summary.items()}
+            for period, summary in summaries.items()}
+
+def test_rollups_match_the_aggregator_after_upsert(store):
+    store.upsert("u1", ROWS)
+    assert normalized(rollups(store)) == normalized(expected(ROWS))
+
+def test_update_moves_amounts_between_rollup_rows(store):
+    store.upsert("u1", ROWS)
+    changed = [tx("2", "Travel", 99.5, "Uber", "Card"), tx("5", "Food", 200, "Swiggy", period="202406")]
+    store.upsert("u1", changed)
+    rows = [ROWS[0], changed[0], ROWS[2], ROWS[3], changed[1]]
+    assert normalized(rollups(store)) == normalized(expected(rows))
+
+def test_delete_removes_emptied_rollup_rows(store):
+    store.upsert("u1", ROWS)
+    assert store.delete("u1", ["3", "4", "missing"]) == 2
+    assert normalized(rollups(store)) == normalized(expected([ROWS[0], ROWS[1], ROWS[4]]))
+    assert store.transactions("u1", "202406") == [ROWS[0], ROWS[1]]
+
+def test_unchanged_reupload_keeps_rollups(store):
+    store.upsert("u1", ROWS)
+    before = rollups(store)
+    assert store.upsert("u1", ROWS) == ["1", "2", "3", "4", "5"]
+    assert rollups(store) == before
+
+@pytest.mark.parametrize("row, message", [
+    ({"Amount": "12", "Period": "202406"}, "transactions[1].Amount must be a number"),
+    ({"Amount": True, "Period": "202406"}, "transactions[1].Amount must be a number"),
+    ({"Amount": float("nan"), "Period": "202406"}, "transactions[1].Amount must be a number"),
+    ({"Period": "202406"}, "transactions[1].Amount must be a number"),
+    ({"Amount": 12, "Period": 202406}, "transactions[1].Period must be a YYYYMM string"),
+    ({"Amount": 12, "Period": "202406", "Category": ["Food"]}, "transactions[1].Category must be a string"),
+    ("12", "transactions[1] must be an object"),
+])
+def test_invalid_rows_are_rejected_before_any_write(store, row, message):
+    with pytest.raises(InvalidTransaction, match=re.escape(message)):
+        store.upsert("u1", [ROWS[0], row])
+    assert store.transactions("u1", "202406") == []
+
+def test_staged_upload_writes_nothing_until_commit(store):
+    upload = store.stage()
+    try:
+        upload.add(ROWS[0])
+        with pytest.raises(InvalidTransaction):
+            upload.add({"Amount": "12", "Period": "202406"})
+    finally:
+        upload.close()
+    assert store.transactions("u1", "202406") == []
+
+def test_staged_upload_commits_in_one_transaction(store):
+    upload = store.stage()
+    try:
+        for row in ROWS:
+            upload.add(row)
+        assert upload.commit("u1") == ["1", "2", "3", "4", "5"]
+    finally:
+        upload.close()
+    assert normalized(rollups(store)) == normalized(expected(ROWS))